@@ -15,6 +15,11 @@ setup(
         'python-dateutil~=2.8.1',
         'singer-python~=5.10.0',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'zstd': ['zstandard'],
+        'test': ['pytest'],
+    },
     entry_points="""
         [console_scripts]
         tap-shopify-partners=tap_shopify_partners:main
@@ -0,0 +1,289 @@
+"""Parallel historical backfill."""
+# -*- coding: utf-8 -*-
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from typing import Any, Optional
+
+import singer
+from singer import utils
+from singer.catalog import Catalog
+
+from tap_shopify_partners import timestamps, tools, writers
+from tap_shopify_partners.ratelimit import RateLimiter
+from tap_shopify_partners.shopify_partners import Shopify, create_client
+from tap_shopify_partners.streams import STREAMS
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+# Slices per worker, more slices than workers balance the load when some
+# periods have a lot more data than others
+SLICES_PER_WORKER: int = 4
+
+# Shopify allows a Partner API client 4 requests per second, shared by all
+# workers
+BACKFILL_REQUEST_INTERVAL: float = 0.25
+
+# Config keys of the recording, of which every slice has its own file
+RECORDING_CONFIG_KEYS: tuple = ('record_path', 'replay_path')
+
+# The rate limiter of a worker process, shared with all other workers
+_RATE_LIMITER: Optional[RateLimiter] = None
+
+
+def _init_worker(interval: float, next_request: Any, lock: Any) -> None:
+    """Initialize a worker process with the shared rate limiter.
+
+    Arguments:
+        interval {float} -- Minimum seconds between requests of all workers
+        next_request {Any} -- Shared time of the next request
+        lock {Any} -- Lock of the shared time
+    """
+    global _RATE_LIMITER  # noqa: WPS420
+    _RATE_LIMITER = RateLimiter(interval, next_request, lock)  # noqa: WPS442
+
+
+def _backfill_slice(task: tuple) -> dict:  # noqa: WPS210
+    """Sync a slice of the range in a worker process.
+
+    The records of every stream are written as Singer RECORD messages to a
+    file per stream and slice.
+
+    Arguments:
+        task {tuple} -- Config, stream ids, slice index, slice start and end
+            and the output directory
+
+    Returns:
+        dict -- The replication key of the last record per stream id
+    """
+    config, stream_ids, index, from_date, to_date, directory = task
+
+    # Every slice records to, or replays from, its own file suffixed with
+    # the slice index, as the slices are synced concurrently
+    config = {
+        **config,
+        **{
+            config_key: f'{config[config_key]}.{index}'
+            for config_key in RECORDING_CONFIG_KEYS
+            if config.get(config_key)
+        },
+    }
+    shopify_partners: Shopify = create_client(
+        config,
+        rate_limiter=_RATE_LIMITER,
+    )
+
+    last_records: dict = {}
+    try:
+        for tap_stream_id in stream_ids:
+            replication_key: str = STREAMS[tap_stream_id]['replication_key']
+            path: str = os.path.join(
+                directory,
+                f'{tap_stream_id}.{index}.jsonl',
+            )
+
+            with open(path, 'w') as output:
+                for row in getattr(shopify_partners, tap_stream_id)(
+                    start_date=from_date,
+                    end_date=to_date,
+                ):
+                    output.write(singer.format_message(singer.RecordMessage(
+                        stream=tap_stream_id,
+                        record=row._asdict(),
+                        time_extracted=utils.now(),
+                    )))
+                    output.write('\n')
+                    last_records[tap_stream_id] = getattr(row, replication_key)
+    finally:
+        # Worker processes exit without running exit handlers, so the
+        # recording is closed here
+        shopify_partners.client.close()
+
+    return last_records
+
+
+def _slices(start_date: int, end_date: int, count: int) -> list:
+    """Partition the range into at most count slices of whole days.
+
+    Arguments:
+        start_date {int} -- Start of the range in epoch microseconds
+        end_date {int} -- End of the range in epoch microseconds (inclusive)
+        count {int} -- Maximum number of slices
+
+    Returns:
+        list -- Start and end of every slice
+    """
+    days: list = list(timestamps.day_windows(start_date, end_date))
+    size: int = math.ceil(len(days) / count)
+    return [
+        (days[first][1], days[min(first + size, len(days)) - 1][2])
+        for first in range(0, len(days), size)
+    ]
+
+
+def backfill(  # noqa: WPS210
+    config: dict,
+    state: dict,
+    catalog: Catalog,
+    from_date: str,
+    to_date: str,
+    workers: int,
+) -> None:
+    """Backfill the selected streams from from_date up to to_date.
+
+    The range is split in slices of whole days that are synced by a pool of
+    worker processes, sharing one request rate budget. Every worker writes
+    its records to its own files. The files are merged in order of the
+    slices per stream into the writer of the config, so the output is
+    ordered as in a normal sync, and a combined state is written at the end
+    of every stream. The bookmark of a stream only moves forward, a
+    backfill of an earlier range keeps the bookmark of the state.
+
+    Arguments:
+        config {dict} -- Tap config
+        state {dict} -- Tap state
+        catalog {Catalog} -- Stream catalog
+        from_date {str} -- Start of the range
+        to_date {str} -- End of the range (exclusive)
+        workers {int} -- Number of worker processes
+
+    Raises:
+        ValueError: When the range is empty or there are no workers
+    """
+    # The derived streams, such as the daily revenue, are not backfilled
+    streams: list = [
+        stream
+        for stream in catalog.get_selected_streams(state)
+        if stream.tap_stream_id in STREAMS
+    ]
+    stream_ids: list = [stream.tap_stream_id for stream in streams]
+
+    range_start: int = timestamps.parse_timestamp(from_date)
+    range_end: int = timestamps.parse_timestamp(to_date)
+    if range_start >= range_end:
+        raise ValueError(
+            f'The backfill range from {from_date} to {to_date} is empty.',
+        )
+    if workers < 1:
+        raise ValueError('A backfill requires at least one worker.')
+
+    slices: list = _slices(
+        range_start,
+        range_end - 1,
+        workers * SLICES_PER_WORKER,
+    )
+    LOGGER.info(
+        f'Backfilling {len(slices)} slices from {from_date} to {to_date} '
+        f'with {workers} workers',
+    )
+
+    interval: float = float(
+        config.get('request_interval', BACKFILL_REQUEST_INTERVAL),
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        tasks: list = [
+            (
+                config,
+                stream_ids,
+                index,
+                timestamps.format_timestamp(slice_start),
+                timestamps.format_timestamp(slice_end),
+                directory,
+            )
+            for index, (slice_start, slice_end) in enumerate(slices)
+        ]
+
+        with multiprocessing.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(
+                interval,
+                multiprocessing.Value('d', 0),
+                multiprocessing.Lock(),
+            ),
+        ) as pool:
+            last_records: list = pool.map(_backfill_slice, tasks, chunksize=1)
+
+        # Merge the files of every stream in order of the slices
+        writer: writers.SingerWriter = writers.create_writer(config)
+        tools.clear_currently_syncing(state)
+        for stream in streams:
+            writer.write_schema(
+                stream_name=stream.tap_stream_id,
+                schema=stream.schema.to_dict(),
+                key_properties=stream.key_properties,
+            )
+
+            bookmark: Optional[str] = None
+            for index, slice_last_records in enumerate(last_records):
+                _merge_slice(
+                    os.path.join(
+                        directory,
+                        f'{stream.tap_stream_id}.{index}.jsonl',
+                    ),
+                    writer,
+                )
+                bookmark = slice_last_records.get(
+                    stream.tap_stream_id,
+                    bookmark,
+                )
+            writer.flush()
+
+            if bookmark:
+                _advance_bookmark(state, stream.tap_stream_id, bookmark)
+            writer.write_state(state)
+        writer.close()
+
+
+def _merge_slice(path: str, writer: writers.SingerWriter) -> None:
+    """Write the records of a slice file to the writer.
+
+    The stdout writer gets the Singer messages of the file as they are.
+
+    Arguments:
+        path {str} -- Slice file with a Singer RECORD message per line
+        writer {SingerWriter} -- Output writer
+    """
+    with open(path) as slice_file:
+        if type(writer) is writers.SingerWriter:  # noqa: WPS516
+            shutil.copyfileobj(slice_file, sys.stdout)
+            return
+
+        for line in slice_file:
+            message: singer.RecordMessage = singer.parse_message(line)
+            writer.write_record(
+                message.stream,
+                message.record,
+                time_extracted=message.time_extracted,
+            )
+
+
+def _advance_bookmark(
+    state: dict,
+    tap_stream_id: str,
+    last_record: str,
+) -> None:
+    """Set the bookmark of a stream past a record, unless it is further.
+
+    Arguments:
+        state {dict} -- Tap state
+        tap_stream_id {str} -- Stream id
+        last_record {str} -- Replication key of the last backfilled record
+    """
+    bookmark_key: str = STREAMS[tap_stream_id]['bookmark']
+    bookmark: str = timestamps.next_bookmark(last_record)
+    current: Optional[str] = singer.get_bookmark(
+        state,
+        tap_stream_id,
+        bookmark_key,
+    )
+    if current and timestamps.parse_timestamp(current) >= (
+        timestamps.parse_timestamp(bookmark)
+    ):
+        return
+    singer.write_bookmark(state, tap_stream_id, bookmark_key, bookmark)
@@ -1,16 +1,60 @@
 """Cleaner functions."""
 # -*- coding: utf-8 -*-
-from decimal import Decimal
-from types import MappingProxyType
+from typing import Any, Optional, Tuple
+
+from tap_shopify_partners.records import RECORD_TYPES
 from tap_shopify_partners.streams import STREAMS
-from dateutil.parser import parse as parse_d
-from typing import Any, Optional
-import collections
+
 
 class ConvertionError(ValueError):
     """Failed to convert value."""
 
 
+class InternTable(object):
+    """Bounded table of shared values.
+
+    Repeated values, such as app names, shop domains and currency codes, are
+    replaced by the first equal value seen, so all records share one object.
+    Once the table is full, new values are no longer added and are returned
+    as is.
+    """
+
+    def __init__(self, max_size: int = 100000) -> None:
+        """Initialize table.
+
+        Keyword Arguments:
+            max_size {int} -- Maximum number of values (default: {100000})
+        """
+        self.max_size: int = max_size
+        self.values: dict = {}
+        self.hits: int = 0
+
+    def __len__(self) -> int:
+        """Return the number of values in the table.
+
+        Returns:
+            int -- Number of values
+        """
+        return len(self.values)
+
+    def intern(self, input_value: Any) -> Any:
+        """Return the shared value equal to the input_value.
+
+        Arguments:
+            input_value {Any} -- Hashable input value
+
+        Returns:
+            Any -- The shared value
+        """
+        shared_value: Any = self.values.get(input_value)
+        if shared_value is not None:
+            self.hits += 1
+            return shared_value
+        if input_value is not None and len(self.values) < self.max_size:
+            self.values[input_value] = input_value
+        return input_value
+
+
 def to_type_or_null(
     input_value: Any,
     data_type: Optional[Any] = None,
@@ -53,220 +97,117 @@ def to_type_or_null(
     # Return the original value
     return input_value
 
-def clean_row(row: dict, mapping: dict) -> dict:
-    """Clean the row according to the mapping.
 
-    The mapping is a dictionary with optional keys:
-    - map: The name of the new key/column
-    - type: A data type or function to apply to the value of the key
-    - nullable: Whether to convert empty values, such as '', {} or [] to None
+def dictionary_encode(column: list) -> Tuple[list, list]:
+    """Dictionary encode a column.
+
+    Every value is replaced by the index of its first occurrence in the
+    dictionary of distinct values. The values must be hashable.
 
     Arguments:
-        row {dict} -- Input row
-        mapping {dict} -- Input mapping
+        column {list} -- Column values
 
     Returns:
-        dict -- Cleaned row
+        Tuple[list, list] -- The codes and the dictionary
     """
-    cleaned: dict = {}
+    index: dict = {}
+    codes: list = [index.setdefault(value, len(index)) for value in column]
+    return codes, list(index)
 
-    key: str
-    key_mapping: dict
 
-    # For every key and value in the mapping
-    for key, key_mapping in mapping.items():
+def extract_column(edges: list, path: tuple) -> list:
+    """Extract the values at the path of every edge as a column.
 
-        # Retrieve the new mapping or use the original
-        new_mapping: str = key_mapping.get('map') or key
+    Missing or empty parents, e.g. fields of a fragment that did not match
+    the node, result in None.
 
-        # Convert the value
-        cleaned[new_mapping] = to_type_or_null(
-            row[key],
-            key_mapping.get('type'),
-            key_mapping.get('null', True),
-        )
+    Arguments:
+        edges {list} -- Edges from the response
+        path {tuple} -- Keys from the edge to the value
 
-    return cleaned
+    Returns:
+        list -- Column values
+    """
+    column: list = edges
+    for key in path:
+        column = [value.get(key) if value else None for value in column]
+    return column
 
-def flatten(
-        dictionary, 
-        parent_key=False, 
-        separator='.'):
-        """
-        Turn a nested dictionary into a flattened dictionary
-        :param dictionary: The dictionary to flatten
-        :param parent_key: The string to prepend to dictionary's keys
-        :param separator: The string used to separate flattened keys
-        :return: A flattened dictionary
-        """
-        items = []
-        for key, value in dictionary.items():
-            new_key = str(parent_key) + separator + key if parent_key else key
-            if isinstance(value, collections.MutableMapping):
-                items.extend(flatten(value, new_key, separator).items())
-            elif isinstance(value, list):
-                for k, v in enumerate(value):
-                    items.extend(flatten({str(k): v}, new_key).items())
-            else:
-                items.append((new_key, value))
-        return dict(items)
-
-def clean_shopify_partners_app_subscription_sale(
-    date_day: str,
-    response_data: dict,
-) -> dict:
-    """Clean shopify_partners_app_subscription_sale data.
 
-        Arguments:
-            response_data {dict} -- input response_data
+def clean_column(
+    column: list,
+    data_type: Optional[Any] = None,
+    nullable: bool = True,
+    intern_table: Optional[InternTable] = None,
+) -> list:
+    """Convert a column with to_type_or_null.
 
-        Returns:
-            dict -- cleaned response_data
-        """
-    # Get the mapping from the STREAMS
-    mapping: Optional[dict] = STREAMS['shopify_partners_app_subscription_sale'].get(
-        'mapping',
-    )
-
-    cleaned_data: dict = {
-        "id": response_data["node.id"],
-        "createdAt": response_data["node.createdAt"],
-        "netAmount": float(response_data["node.netAmount.amount"]),
-        "netAmountCurrencyCode": response_data["node.netAmount.currencyCode"],
-        "grossAmount": float(response_data["node.grossAmount.amount"]),
-        "grossAmountCurrencyCode": response_data["node.grossAmount.currencyCode"],
-        "shopifyFee": float(response_data["node.shopifyFee.amount"]),
-        "shopifyFeeCurrencyCode": response_data["node.shopifyFee.currencyCode"],
-        "app": response_data["node.app.name"],
-        "appId": response_data["node.app.id"],
-        "shopDomain": response_data["node.shop.myshopifyDomain"],
-        "shopName": response_data["node.shop.name"],
-        "shopId": response_data["node.shop.id"],
-        "billingInterval": response_data["node.billingInterval"],
-        "chargeId": response_data["node.chargeId"],
-    }
-
-    return clean_row(cleaned_data, mapping)
-
-def clean_shopify_partners_app_sale_adjustment(
-    date_day: str,
-    response_data: dict,
-) -> dict:
-    """Clean shopify_partners_app_sale_adjustment data.
+    The column is dictionary encoded first, so every distinct value is
+    converted only once, e.g. a page of sales has only a few distinct
+    amounts, currencies, apps and shops.
 
-        Arguments:
-            response_data {dict} -- input response_data
+    Arguments:
+        column {list} -- Column values
 
-        Returns:
-            dict -- cleaned response_data
-        """
-    # Get the mapping from the STREAMS
-    mapping: Optional[dict] = STREAMS['shopify_partners_app_sale_adjustment'].get(
-        'mapping',
-    )
-
-    cleaned_data: dict = {
-        "app": response_data["node.app.name"],
-        "appId": response_data["node.app.id"],
-        "chargeId": response_data["node.chargeId"],
-        "createdAt": response_data["node.createdAt"],
-        "grossAmount": float(response_data["node.grossAmount.amount"]),
-        "grossAmountCurrencyCode": response_data["node.grossAmount.currencyCode"],
-        "id": response_data["node.id"],
-        "netAmount": float(response_data["node.netAmount.amount"]),
-        "netAmountCurrencyCode": response_data["node.netAmount.currencyCode"],
-        "shopDomain": response_data["node.shop.myshopifyDomain"],
-        "shopName": response_data["node.shop.name"],
-        "shopId": response_data["node.shop.id"],
-        "shopifyFee": float(response_data["node.shopifyFee.amount"]),
-        "shopifyFeeCurrencyCode": response_data["node.shopifyFee.currencyCode"],
-    }
-
-    return clean_row(cleaned_data, mapping)
-
-def clean_shopify_partners_app_relationship(
-    date_day: str,
-    response_data: dict,
-) -> dict:
-    """Clean shopify_partners_app_relationship data.
+    Keyword Arguments:
+        data_type {Optional[Any]} -- Data type to convert to (default: {None})
+        nullable {bool} -- Whether to convert empty to None (default: {True})
+        intern_table {Optional[InternTable]} -- Table to share the converted
+            values through (default: {None})
 
-        Arguments:
-            response_data {dict} -- input response_data
+    Returns:
+        list -- Converted column values
+    """
+    codes, dictionary = dictionary_encode(column)
+    converted: list = [
+        to_type_or_null(input_value, data_type, nullable)
+        for input_value in dictionary
+    ]
+    if intern_table is not None:
+        converted = [intern_table.intern(value) for value in converted]
+    return [converted[code] for code in codes]
+
+
+def clean_page(
+    tap_stream_id: str,
+    edges: list,
+    intern_table: Optional[InternTable] = None,
+) -> list:
+    """Clean a page of edges column by column.
+
+    The mapping of the stream in STREAMS has an entry per field of the
+    stream's record type, in the same order, with the keys:
+    - map: The name of the field, when it differs from the entry's key
+    - path: The keys from the edge to the value
+    - type: A data type or function to apply to the value
+    - null: Whether to convert empty values, such as '', {} or [] to None
+    - intern: Whether to share the values through the intern_table
 
-        Returns:
-            dict -- cleaned response_data
-        """
-    # Get the mapping from the STREAMS
-    mapping: Optional[dict] = STREAMS['shopify_partners_app_relationship'].get(
-        'mapping',
-    )
-
-    if response_data["node.type"] == "RELATIONSHIP_UNINSTALLED":
-        cleaned_data: dict = {
-            "app": response_data["node.app.name"],
-            "appId": response_data["node.app.id"],
-            "occurredAt": response_data["node.occurredAt"],
-            "shopDomain": response_data["node.shop.myshopifyDomain"],
-            "shopName": response_data["node.shop.name"],
-            "shopId": response_data["node.shop.id"],
-            "type": response_data["node.type"],
-            "description": response_data["node.description"],
-            "reason": response_data["node.reason"],
-        }
-    else:
-        cleaned_data: dict = {
-            "app": response_data["node.app.name"],
-            "appId": response_data["node.app.id"],
-            "occurredAt": response_data["node.occurredAt"],
-            "shopDomain": response_data["node.shop.myshopifyDomain"],
-            "shopName": response_data["node.shop.name"],
-            "shopId": response_data["node.shop.id"],
-            "type": response_data["node.type"],
-            "description": None,
-            "reason": None,
-        }
-
-    return clean_row(cleaned_data, mapping)
-
-def clean_shopify_partners_app_subscription_charge(
-    date_day: str,
-    response_data: dict,
-) -> dict:
-    """Clean shopify_partners_app_subscription_charge data.
+    Arguments:
+        tap_stream_id {str} -- Stream id
+        edges {list} -- Edges from the response
 
-        Arguments:
-            response_data {dict} -- input response_data
+    Keyword Arguments:
+        intern_table {Optional[InternTable]} -- Table of shared values
+            (default: {None})
 
-        Returns:
-            dict -- cleaned response_data
-        """
-    # Get the mapping from the STREAMS
-    mapping: Optional[dict] = STREAMS['shopify_partners_app_subscription_charge'].get(
-        'mapping',
-    )
-
-    cleaned_data: dict = {
-        "app": response_data["node.app.name"],
-        "appId": response_data["node.app.id"],
-        "subscriptionCharge": float(response_data["node.charge.amount.amount"]),
-        "subscriptionChargeCurrencyCode": response_data["node.charge.amount.currencyCode"],
-        "billingOn": response_data["node.charge.billingOn"],
-        "id": response_data["node.charge.id"],
-        "name": response_data["node.charge.name"],
-        "test": response_data["node.charge.test"],
-        "occurredAt": response_data["node.occurredAt"],
-        "shopDomain": response_data["node.shop.myshopifyDomain"],
-        "shopName": response_data["node.shop.name"],
-        "shopId": response_data["node.shop.id"],
-        "type": response_data["node.type"],
-    }
-
-    return clean_row(cleaned_data, mapping)
-
-# Collect all cleaners
-CLEANERS: MappingProxyType = MappingProxyType({
-    'shopify_partners_app_subscription_sale': clean_shopify_partners_app_subscription_sale,
-    'shopify_partners_app_sale_adjustment': clean_shopify_partners_app_sale_adjustment,
-    'shopify_partners_app_relationship': clean_shopify_partners_app_relationship,
-    'shopify_partners_app_subscription_charge': clean_shopify_partners_app_subscription_charge
-})
\ No newline at end of file
+    Returns:
+        list -- Cleaned records of the stream's record type
+    """
+    mapping: dict = STREAMS[tap_stream_id]['mapping']
+
+    columns: list = []
+
+    # For every key in the mapping, clean the whole column at once
+    for key_mapping in mapping.values():
+        columns.append(
+            clean_column(
+                extract_column(edges, key_mapping['path']),
+                key_mapping.get('type'),
+                key_mapping.get('null', True),
+                intern_table if key_mapping.get('intern') else None,
+            ),
+        )
+
+    # Emit the records from the columns
+    return list(map(RECORD_TYPES[tap_stream_id]._make, zip(*columns)))
@@ -0,0 +1,287 @@
+"""Long-running daemon mode."""
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Any, Optional
+
+import httpx
+import singer
+from singer.catalog import Catalog, CatalogEntry
+
+from tap_shopify_partners import tools, writers
+from tap_shopify_partners.shopify_partners import Shopify
+from tap_shopify_partners.streams import STREAMS
+from tap_shopify_partners.sync import sync, sync_record
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+# Seconds between two polls of a stream
+DEFAULT_POLL_INTERVAL: float = 300
+
+# Seconds before a failed poll is retried, doubled for every next failure
+# up to the maximum
+ERROR_BACKOFF: float = 30
+MAX_ERROR_BACKOFF: float = 900
+
+# Stream and seconds between two polls in follow mode
+DEFAULT_FOLLOW_STREAM: str = 'shopify_partners_app_relationship'
+DEFAULT_FOLLOW_INTERVAL: float = 5
+
+
+def load_state(path: Optional[str], state: dict) -> dict:
+    """Load the state saved by a previous daemon.
+
+    Arguments:
+        path {Optional[str]} -- Path of the state file
+        state {dict} -- State to use when there is no saved state
+
+    Returns:
+        dict -- The saved state, or the given state
+    """
+    if not path or not os.path.exists(path):
+        return state
+
+    with open(path) as state_file:
+        return json.load(state_file)
+
+
+def save_state(path: Optional[str], state: dict) -> None:
+    """Save the state for the next daemon.
+
+    The file is replaced atomically, so a crash keeps the previous state.
+
+    Arguments:
+        path {Optional[str]} -- Path of the state file
+        state {dict} -- State
+    """
+    if not path:
+        return
+
+    temp_path: str = f'{path}.tmp'
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file)
+        state_file.flush()
+        os.fsync(state_file.fileno())
+    os.replace(temp_path, path)
+
+
+def run_daemon(  # noqa: WPS210
+    shopify_partners: Shopify,
+    state: dict,
+    catalog: Catalog,
+    config: dict,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """Poll the selected streams until stopped.
+
+    The client, with its HTTP/2 connection, and the writer stay open between
+    polls. Every stream is polled every daemon_poll_interval seconds, or the
+    interval of the stream in daemon_poll_intervals. After every poll the
+    writer is flushed, which starts new shards or Parquet files, and the
+    state is saved atomically to state_path. A poll that fails with an HTTP
+    error, after the retries of the client, is logged and its streams are
+    polled again after a backoff, starting from the records written before
+    the error. SIGTERM and SIGINT stop the daemon after the current poll.
+
+    Arguments:
+        shopify_partners {Shopify} -- Shopify Partners client
+        state {dict} -- Tap state, used when there is no saved state
+        catalog {Catalog} -- Stream catalog
+        config {dict} -- Tap config
+
+    Keyword Arguments:
+        stop {Optional[threading.Event]} -- Event to stop the daemon, stopped
+            by SIGTERM and SIGINT when not given (default: {None})
+    """
+    if stop is None:
+        stop = threading.Event()
+        _stop_on_signals(stop)
+
+    state_path: Optional[str] = config.get('state_path')
+    state = load_state(state_path, state)
+
+    default_interval: float = float(
+        config.get('daemon_poll_interval', DEFAULT_POLL_INTERVAL),
+    )
+    intervals: dict = {
+        stream.tap_stream_id: float(
+            config.get('daemon_poll_intervals', {}).get(
+                stream.tap_stream_id,
+                default_interval,
+            ),
+        )
+        for stream in catalog.get_selected_streams(state)
+        if stream.tap_stream_id in STREAMS
+    }
+    if not intervals:
+        LOGGER.info('No streams selected, nothing to poll')
+        return
+    next_polls: dict = dict.fromkeys(intervals, time.monotonic())
+
+    LOGGER.info(f'Daemon polling streams every: {intervals} seconds')
+
+    failures: int = 0
+    writer: writers.SingerWriter = writers.create_writer(config)
+    try:
+        while not stop.is_set():
+            poll_start: float = time.monotonic()
+            due: list = [
+                tap_stream_id
+                for tap_stream_id, next_poll in next_polls.items()
+                if next_poll <= poll_start
+            ]
+
+            if due:
+                LOGGER.info(f'Polling streams: {due}')
+                backoff: Optional[float] = None
+                try:
+                    sync(
+                        shopify_partners,
+                        state,
+                        catalog,
+                        config['start_date'],
+                        config,
+                        writer=writer,
+                        stream_ids=due,
+                    )
+                except httpx.HTTPError as err:
+                    failures += 1
+                    backoff = min(
+                        ERROR_BACKOFF * 2 ** (failures - 1),
+                        MAX_ERROR_BACKOFF,
+                    )
+                    LOGGER.error(
+                        f'Poll of {due} failed, retrying in {backoff} '
+                        f'seconds: {err!r}',
+                    )
+                else:
+                    failures = 0
+
+                # Keep the records and state of the poll, also when it failed
+                writer.flush()
+                save_state(state_path, state)
+                for tap_stream_id in due:
+                    next_polls[tap_stream_id] = poll_start + (
+                        backoff or intervals[tap_stream_id]
+                    )
+
+            stop.wait(max(0, min(next_polls.values()) - time.monotonic()))
+    finally:
+        writer.close()
+        save_state(state_path, state)
+
+    LOGGER.info('Daemon stopped')
+
+
+def run_follow(  # noqa: WPS210
+    shopify_partners: Shopify,
+    state: dict,
+    catalog: Catalog,
+    config: dict,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """Follow the new events of one stream until stopped.
+
+    The stream, follow_stream in the config, is polled every follow_interval
+    seconds from just after its last record, with the same query and cleaner
+    as a normal sync. The new records are written as soon as they are
+    polled, after which the writer is flushed and the state is saved
+    atomically to state_path. A poll that fails with an HTTP error, after
+    the retries of the client, is logged and the stream is followed again
+    after a backoff, from just after the last record written before the
+    error.
+
+    Arguments:
+        shopify_partners {Shopify} -- Shopify Partners client
+        state {dict} -- Tap state, used when there is no saved state
+        catalog {Catalog} -- Stream catalog
+        config {dict} -- Tap config
+
+    Keyword Arguments:
+        stop {Optional[threading.Event]} -- Event to stop following, stopped
+            by SIGTERM and SIGINT when not given (default: {None})
+    """
+    if stop is None:
+        stop = threading.Event()
+        _stop_on_signals(stop)
+
+    state_path: Optional[str] = config.get('state_path')
+    state = load_state(state_path, state)
+
+    tap_stream_id: str = config.get('follow_stream', DEFAULT_FOLLOW_STREAM)
+    stream: CatalogEntry = catalog.get_stream(tap_stream_id)
+    interval: float = float(
+        config.get('follow_interval', DEFAULT_FOLLOW_INTERVAL),
+    )
+
+    failures: int = 0
+    writer: writers.SingerWriter = writers.create_writer(config)
+    writer.write_schema(
+        stream_name=tap_stream_id,
+        schema=stream.schema.to_dict(),
+        key_properties=stream.key_properties,
+    )
+    try:
+        while not stop.is_set():
+            # Follow from just after the last written record
+            stream_state: dict = tools.get_stream_state(
+                state,
+                tap_stream_id,
+            ) or {}
+            start_date: str = stream_state.get(
+                STREAMS[tap_stream_id]['bookmark'],
+                config['start_date'],
+            )
+
+            try:
+                for poll_records in shopify_partners.follow(
+                    tap_stream_id,
+                    start_date,
+                    interval,
+                    stop,
+                ):
+                    failures = 0
+                    if not poll_records:
+                        continue
+                    for row in poll_records:
+                        sync_record(stream, row, state, writer)
+                    writer.flush()
+                    save_state(state_path, state)
+            except httpx.HTTPError as err:
+                failures += 1
+                backoff: float = min(
+                    ERROR_BACKOFF * 2 ** (failures - 1),
+                    MAX_ERROR_BACKOFF,
+                )
+                LOGGER.error(
+                    f'Following {tap_stream_id} failed, retrying in '
+                    f'{backoff} seconds: {err!r}',
+                )
+
+                # Keep the records and state written before the error
+                writer.flush()
+                save_state(state_path, state)
+                stop.wait(backoff)
+    finally:
+        writer.close()
+        save_state(state_path, state)
+
+    LOGGER.info('Stopped following')
+
+
+def _stop_on_signals(stop: threading.Event) -> None:
+    """Set the stop event on SIGTERM and SIGINT.
+
+    Arguments:
+        stop {threading.Event} -- Event to set
+    """
+    def handler(signum: int, frame: Any) -> None:  # noqa: WPS430
+        LOGGER.info(f'Received signal {signum}, stopping after this poll')
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
@@ -0,0 +1,93 @@
+"""Record deduplication."""
+# -*- coding: utf-8 -*-
+import json
+import os
+from collections import OrderedDict
+from typing import Optional
+
+
+class DedupIndex(object):
+    """Bounded index of the keys of recently emitted records.
+
+    The index is a least recently used set. When it is full, the key that was
+    seen longest ago is evicted. Records of overlapping windows or re-runs
+    are close in time, so a bounded index is enough to catch them.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """Initialize index.
+
+        Arguments:
+            max_size {int} -- Maximum number of keys
+        """
+        self.max_size: int = max_size
+        self.keys: OrderedDict = OrderedDict()
+        self.dropped: int = 0
+
+    def seen(self, key: tuple) -> bool:
+        """Add the key and return whether it was already in the index.
+
+        Arguments:
+            key {tuple} -- Record key
+
+        Returns:
+            bool -- Whether the record was already emitted
+        """
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            self.dropped += 1
+            return True
+
+        self.keys[key] = None
+        if len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+        return False
+
+
+def load_indexes(path: Optional[str], max_size: int) -> dict:
+    """Load the dedup index of every stream from a previous run.
+
+    Arguments:
+        path {Optional[str]} -- Path of the index file
+        max_size {int} -- Maximum number of keys per stream
+
+    Returns:
+        dict -- Dedup index per stream id
+    """
+    if not path or not os.path.exists(path):
+        return {}
+
+    with open(path) as index_file:
+        saved: dict = json.load(index_file)
+
+    indexes: dict = {}
+    for tap_stream_id, keys in saved.items():
+        index: DedupIndex = DedupIndex(max_size)
+        for key in keys[-max_size:]:
+            index.keys[tuple(key)] = None
+        indexes[tap_stream_id] = index
+    return indexes
+
+
+def save_indexes(path: Optional[str], indexes: dict) -> None:
+    """Save the dedup index of every stream for the next run.
+
+    The file is replaced atomically, so a failed run keeps the previous one.
+
+    Arguments:
+        path {Optional[str]} -- Path of the index file
+        indexes {dict} -- Dedup index per stream id
+    """
+    if not path:
+        return
+
+    temp_path: str = f'{path}.tmp'
+    with open(temp_path, 'w') as index_file:
+        json.dump(
+            {
+                tap_stream_id: list(index.keys)
+                for tap_stream_id, index in indexes.items()
+            },
+            index_file,
+        )
+    os.replace(temp_path, path)
@@ -4,7 +4,7 @@ from singer import metadata
 from singer.catalog import Catalog, CatalogEntry
 
 from tap_shopify_partners.schema import load_schemas
-from tap_shopify_partners.streams import STREAMS
+from tap_shopify_partners.streams import DERIVED_STREAMS, STREAMS
 
 
 def discover() -> Catalog:  # noqa: WPS210
@@ -18,7 +18,7 @@ def discover() -> Catalog:  # noqa: WPS210
     # Parse every schema
     for stream_id, schema in raw_schemas.items():
 
-        stream_meta: dict = STREAMS[stream_id]
+        stream_meta: dict = STREAMS.get(stream_id) or DERIVED_STREAMS[stream_id]
         # Create metadata
         mdata: list = metadata.get_standard_metadata(
             schema=schema.to_dict(),
@@ -0,0 +1,135 @@
+"""External sort."""
+# -*- coding: utf-8 -*-
+import heapq
+import pickle  # noqa: S403
+import tempfile
+from typing import IO, Callable, Generator, Iterable
+
+# Records per pickled chunk of a run
+CHUNK_SIZE: int = 1000
+
+
+class ExternalSort(object):
+    """Sort records with a bounded number of records in memory.
+
+    The records are buffered until max_records, then the buffer is sorted
+    and spilled to a temporary file as a run. The sorted records are merged
+    from the runs. Both the sort of a run and the merge of the runs, in the
+    order they were spilled, are stable, so the order is the same as that of
+    sorting all records in memory.
+
+    The runs hold the records as plain tuples, the record type rebuilds them.
+    """
+
+    def __init__(
+        self,
+        key: Callable,
+        max_records: int,
+        record_type: type,
+    ) -> None:
+        """Initialize sort.
+
+        Arguments:
+            key {Callable} -- Sort key of a record
+            max_records {int} -- Maximum records in memory, 0 keeps all
+                records in memory
+            record_type {type} -- Named tuple type of the records
+        """
+        self.key: Callable = key
+        self.max_records: int = max_records
+        self.record_type: type = record_type
+        self.buffer: list = []
+        self.runs: list = []
+        self.count: int = 0
+
+    def __len__(self) -> int:
+        """Return the number of records.
+
+        Returns:
+            int -- Number of records
+        """
+        return self.count
+
+    def extend(self, new_records: Iterable[tuple]) -> None:
+        """Add records, spilling a run when the buffer is full.
+
+        Arguments:
+            new_records {Iterable[tuple]} -- Records
+        """
+        for record in new_records:
+            self.buffer.append(record)
+            self.count += 1
+            if self.max_records and len(self.buffer) >= self.max_records:
+                self._spill()
+
+    def shrink(self) -> int:
+        """Halve the records in memory, spilling the buffer when it is full.
+
+        The maximum is not halved below a chunk, unless it already was.
+
+        Returns:
+            int -- New maximum records in memory
+        """
+        self.max_records = max(
+            (self.max_records or len(self.buffer)) // 2,
+            min(self.max_records or CHUNK_SIZE, CHUNK_SIZE),
+        )
+        if len(self.buffer) >= self.max_records:
+            self._spill()
+        return self.max_records
+
+    def sorted(self) -> Generator[tuple, None, None]:  # noqa: WPS603
+        """Yield the records in order and close the runs.
+
+        Yields:
+            Generator[tuple] -- The records, sorted by the key
+        """
+        self.buffer.sort(key=self.key)
+        if not self.runs:
+            yield from self.buffer
+            self.buffer = []
+            return
+
+        if self.buffer:
+            self._spill()
+        try:
+            yield from heapq.merge(
+                *(self._read(run) for run in self.runs),
+                key=self.key,
+            )
+        finally:
+            for run in self.runs:
+                run.close()
+            self.runs = []
+
+    def _spill(self) -> None:
+        """Sort the buffer and write it to a temporary file as a run."""
+        self.buffer.sort(key=self.key)
+        run: IO[bytes] = tempfile.TemporaryFile()
+        for start in range(0, len(self.buffer), CHUNK_SIZE):
+            chunk: list = self.buffer[start:start + CHUNK_SIZE]
+            pickle.dump(
+                list(map(tuple, chunk)),
+                run,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer = []
+
+    def _read(self, run: IO[bytes]) -> Generator[tuple, None, None]:
+        """Yield the records of a run.
+
+        Arguments:
+            run {IO[bytes]} -- Temporary file of the run
+
+        Yields:
+            Generator[tuple] -- The records of the run, in order
+        """
+        make: Callable = self.record_type._make
+        while True:
+            try:
+                chunk: list = pickle.load(run)  # noqa: S301
+            except EOFError:
+                return
+            yield from map(make, chunk)
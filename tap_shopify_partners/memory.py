@@ -0,0 +1,181 @@
+"""Memory usage helpers."""
+# -*- coding: utf-8 -*-
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from types import MappingProxyType
+from typing import Optional
+
+import singer
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+MEGABYTE: int = 1024 * 1024
+
+# Share of the memory budget from which the memory use is reduced
+PRESSURE_THRESHOLD: float = 0.8
+
+# Seconds between two reductions by the same stage, so the memory freed by
+# the previous reduction shows in the RSS first
+PRESSURE_INTERVAL: float = 10
+
+# Seconds between two snapshots of the traced allocations
+TRACE_INTERVAL: float = 5
+
+# Frames kept of every traced allocation, enough to reach the tap module
+# that made it from deep in httpx
+TRACE_FRAMES: int = 25
+
+PACKAGE_PATH: str = os.path.dirname(os.path.abspath(__file__))
+
+# Stage of the allocations made in every module of the tap
+STAGES: MappingProxyType = MappingProxyType({
+    os.path.join(PACKAGE_PATH, module): stage
+    for module, stage in (
+        ('shopify_partners.py', 'pages'),
+        ('pipeline.py', 'pages'),
+        ('replay.py', 'pages'),
+        ('cleaners.py', 'day buffer'),
+        ('records.py', 'day buffer'),
+        ('streams.py', 'day buffer'),
+        ('extsort.py', 'day buffer'),
+        ('sync.py', 'output'),
+        ('writers.py', 'output'),
+        ('mirror.py', 'output'),
+        ('rollup.py', 'output'),
+        ('transform.py', 'output'),
+        ('validation.py', 'output'),
+    )
+})
+
+
+def rss() -> int:
+    """Return the resident set size of the process.
+
+    The current RSS is read from /proc when available. Elsewhere the peak RSS
+    reported by getrusage is used instead.
+
+    Returns:
+        int -- RSS in bytes
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages: int = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        max_rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+    return resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def format_size(size: int) -> str:
+    """Format a number of bytes in megabytes.
+
+    Arguments:
+        size {int} -- Size in bytes
+
+    Returns:
+        str -- Size, e.g. 12.3 MB
+    """
+    return f'{size / MEGABYTE:.1f} MB'
+
+
+def stage_sizes() -> dict:
+    """Return the size of the traced allocations of every stage.
+
+    An allocation belongs to the stage of the innermost tap module in its
+    traceback.
+
+    Returns:
+        dict -- Traced bytes per stage
+    """
+    sizes: dict = dict.fromkeys(STAGES.values(), 0)
+    snapshot: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+    for statistic in snapshot.statistics('traceback'):
+        # The frames are sorted from the oldest to the most recent
+        for frame in reversed(statistic.traceback):
+            stage: Optional[str] = STAGES.get(frame.filename)
+            if stage:
+                sizes[stage] += statistic.size
+                break
+    return sizes
+
+
+class MemoryBudget(object):
+    """Keep the memory use of the tap within a budget.
+
+    The stages of the tap check the RSS as they buffer records. From
+    PRESSURE_THRESHOLD of the budget, a check tells the stage to reduce its
+    memory use, at most every PRESSURE_INTERVAL seconds per stage. The peak
+    RSS is kept per stream. Optionally, the allocations are traced and their
+    size per stage is sampled every TRACE_INTERVAL seconds.
+    """
+
+    def __init__(self, budget: int, trace_stages: bool = False) -> None:
+        """Initialize memory budget.
+
+        Arguments:
+            budget {int} -- Memory budget in bytes
+
+        Keyword Arguments:
+            trace_stages {bool} -- Trace the allocations of every stage,
+                which slows down every allocation (default: {False})
+        """
+        self.budget: int = budget
+        self.threshold: int = int(budget * PRESSURE_THRESHOLD)
+        self.trace_stages: bool = trace_stages
+        self.peaks: dict = {}
+        self.last_pressure: dict = {}
+        self.last_trace: float = 0
+        self.lock: threading.Lock = threading.Lock()
+        if trace_stages and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def under_pressure(self, tap_stream_id: str, stage: str) -> bool:
+        """Sample the memory use and tell whether a stage should reduce it.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+            stage {str} -- Stage that checks
+
+        Returns:
+            bool -- Whether the stage should reduce its memory use
+        """
+        usage: int = rss()
+        now: float = time.monotonic()
+        with self.lock:
+            peaks: dict = self.peaks.setdefault(tap_stream_id, {'RSS': 0})
+            peaks['RSS'] = max(peaks['RSS'], usage)
+            if self.trace_stages and now - self.last_trace >= TRACE_INTERVAL:
+                self.last_trace = now
+                for stage_name, size in stage_sizes().items():
+                    peaks[stage_name] = max(peaks.get(stage_name, 0), size)
+
+            if usage < self.threshold:
+                return False
+            if now - self.last_pressure.get(stage, -PRESSURE_INTERVAL) < (
+                PRESSURE_INTERVAL
+            ):
+                return False
+            self.last_pressure[stage] = now
+
+        LOGGER.warning(
+            f'RSS {format_size(usage)} of a memory budget of '
+            f'{format_size(self.budget)}, reducing the {stage} of '
+            f'{tap_stream_id}',
+        )
+        return True
+
+    def report(self) -> None:
+        """Log the peak memory use of every stream."""
+        for tap_stream_id, peaks in self.peaks.items():
+            LOGGER.info(
+                f'Peak memory of {tap_stream_id}: ' + ', '.join(
+                    f'{name} {format_size(size)}'
+                    for name, size in peaks.items()
+                ),
+            )
@@ -0,0 +1,170 @@
+"""Local SQLite mirror of the streams."""
+# -*- coding: utf-8 -*-
+import json
+import sqlite3
+from typing import Generator, Optional
+
+from tap_shopify_partners import timestamps
+from tap_shopify_partners.records import RECORD_TYPES
+from tap_shopify_partners.schema import load_schemas
+from tap_shopify_partners.streams import STREAMS
+
+# Column with the replication key in epoch microseconds, for range queries
+REPLICATED_AT: str = '_replicated_at'
+
+
+class Mirror(object):
+    """SQLite mirror of the records of every stream.
+
+    Every stream has a table with a column per record field, keyed by the
+    dedup key of the stream and indexed by the replication key. The mirror
+    is updated by one tap and can be read by many others at the same time,
+    the database is in WAL mode.
+    """
+
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        """Initialize mirror.
+
+        Arguments:
+            path {str} -- Path of the SQLite database
+
+        Keyword Arguments:
+            read_only {bool} -- Whether to open the mirror read only
+                (default: {False})
+        """
+        self.read_only: bool = read_only
+        if read_only:
+            self.connection: sqlite3.Connection = sqlite3.connect(
+                f'file:{path}?mode=ro',
+                uri=True,
+            )
+            return
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS _state '
+            '(id INTEGER PRIMARY KEY, value TEXT)',
+        )
+        for tap_stream_id in STREAMS:
+            self._create_table(tap_stream_id)
+        self.connection.commit()
+
+    def upsert(self, tap_stream_id: str, record: dict) -> None:
+        """Insert or replace a record.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+            record {dict} -- Record
+        """
+        fields: tuple = RECORD_TYPES[tap_stream_id]._fields
+        replication_key: str = STREAMS[tap_stream_id]['replication_key']
+        self.connection.execute(
+            f'INSERT OR REPLACE INTO {tap_stream_id} '  # noqa: S608
+            f'({", ".join(fields)}, {REPLICATED_AT}) '
+            f'VALUES ({", ".join("?" * (len(fields) + 1))})',
+            [record[field] for field in fields] + [
+                timestamps.parse_timestamp(record[replication_key]),
+            ],
+        )
+
+    def commit(self, state: Optional[dict] = None) -> None:
+        """Commit the upserted records, together with the state.
+
+        Keyword Arguments:
+            state {Optional[dict]} -- State of the mirror (default: {None})
+        """
+        if state is not None:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO _state (id, value) VALUES (1, ?)',
+                (json.dumps(state),),
+            )
+        self.connection.commit()
+
+    def state(self) -> dict:
+        """Return the state of the last commit.
+
+        Returns:
+            dict -- State of the mirror
+        """
+        row: Optional[tuple] = self.connection.execute(
+            'SELECT value FROM _state WHERE id = 1',
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def read(
+        self,
+        tap_stream_id: str,
+        **kwargs: dict,
+    ) -> Generator[tuple, None, None]:
+        """Yield the records of a stream from the mirror.
+
+        The records are yielded in order of the replication key, like the
+        client methods of the Shopify object.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+
+        Keyword Arguments:
+            start_date {str} -- Start of the range
+            end_date {str} -- End of the range (default: no end)
+
+        Raises:
+            ValueError: When the parameter start_date is missing
+
+        Yields:
+            Generator[tuple] -- Records of the stream's record type
+        """
+        start_date_input: str = str(kwargs.get('start_date', ''))
+        if not start_date_input:
+            raise ValueError('The parameter start_date is required.')
+
+        end_date: int = timestamps.now()
+        if kwargs.get('end_date'):
+            end_date = timestamps.parse_timestamp(str(kwargs['end_date']))
+
+        record_type: type = RECORD_TYPES[tap_stream_id]
+        schema: dict = load_schemas()[tap_stream_id].to_dict()
+        booleans: list = [
+            index
+            for index, field in enumerate(record_type._fields)
+            if 'boolean' in schema['properties'][field]['type']
+        ]
+
+        cursor: sqlite3.Cursor = self.connection.execute(
+            f'SELECT {", ".join(record_type._fields)} '  # noqa: S608
+            f'FROM {tap_stream_id} '
+            f'WHERE {REPLICATED_AT} BETWEEN ? AND ? '
+            f'ORDER BY {REPLICATED_AT}, rowid',
+            (timestamps.parse_timestamp(start_date_input), end_date),
+        )
+        for row in cursor:
+            if booleans:
+                row = list(row)
+                for index in booleans:
+                    if row[index] is not None:
+                        row[index] = bool(row[index])
+            yield record_type._make(row)
+
+    def close(self) -> None:
+        """Close the mirror."""
+        self.connection.close()
+
+    def _create_table(self, tap_stream_id: str) -> None:
+        """Create the table and index of a stream if they do not exist.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+        """
+        fields: tuple = RECORD_TYPES[tap_stream_id]._fields
+        dedup_key: str = ', '.join(STREAMS[tap_stream_id]['dedup_key'])
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {tap_stream_id} '
+            f'({", ".join(fields)}, {REPLICATED_AT} INTEGER NOT NULL, '
+            f'PRIMARY KEY ({dedup_key}))',
+        )
+        self.connection.execute(
+            f'CREATE INDEX IF NOT EXISTS {tap_stream_id}{REPLICATED_AT} '
+            f'ON {tap_stream_id} ({REPLICATED_AT})',
+        )
@@ -0,0 +1,210 @@
+"""Multi-organization sync."""
+# -*- coding: utf-8 -*-
+import copy
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+import singer
+from singer.catalog import Catalog
+
+from tap_shopify_partners import writers
+from tap_shopify_partners.replay import RecordingClient, ReplayClient
+from tap_shopify_partners.shopify_partners import create_client
+from tap_shopify_partners.sync import sync
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+# Column with the organization of every record
+ORGANIZATION_ID: str = 'organization_id'
+
+
+class OrganizationWriter(writers.SingerWriter):
+    """Write the messages of one organization to a shared writer.
+
+    Every record gets the organization_id column, which is also added to the
+    schema and key properties. The state of the organization is written as
+    its partition of the state of all organizations, as a copy, since the
+    sync of the organization keeps changing its state outside the lock. The
+    writers of all organizations share a lock, so their messages are not
+    interleaved.
+    """
+
+    def __init__(
+        self,
+        writer: writers.SingerWriter,
+        organization_id: str,
+        state: dict,
+        lock: threading.Lock,
+    ) -> None:
+        """Initialize writer.
+
+        Arguments:
+            writer {SingerWriter} -- Shared writer
+            organization_id {str} -- Organization id
+            state {dict} -- State of all organizations
+            lock {threading.Lock} -- Lock of the shared writer and state
+        """
+        self.writer: writers.SingerWriter = writer
+        self.organization_id: str = organization_id
+        self.state: dict = state
+        self.lock: threading.Lock = lock
+
+    def write_schema(
+        self,
+        stream_name: str,
+        schema: dict,
+        key_properties: list,
+    ) -> None:
+        """Write the schema of a stream with the organization_id column.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            schema {dict} -- JSON schema
+            key_properties {list} -- Key properties
+        """
+        schema = copy.deepcopy(schema)
+        schema['properties'][ORGANIZATION_ID] = {'type': 'string'}
+        if isinstance(key_properties, str):
+            key_properties = [key_properties]
+        with self.lock:
+            self.writer.write_schema(
+                stream_name,
+                schema,
+                [ORGANIZATION_ID, *(key_properties or [])],
+            )
+
+    def write_record(
+        self,
+        stream_name: str,
+        record: dict,
+        time_extracted: datetime,
+    ) -> None:
+        """Write a record with the organization_id column.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            record {dict} -- Record
+            time_extracted {datetime} -- Time of extraction
+        """
+        record[ORGANIZATION_ID] = self.organization_id
+        with self.lock:
+            self.writer.write_record(stream_name, record, time_extracted)
+
+    def write_state(self, state: dict) -> None:
+        """Write the state of all organizations.
+
+        Arguments:
+            state {dict} -- State of the organization
+        """
+        partition: dict = copy.deepcopy(state)
+        with self.lock:
+            self.state['organizations'][self.organization_id] = partition
+            self.writer.write_state(self.state)
+
+    def flush(self) -> None:
+        """Flush the shared writer."""
+        with self.lock:
+            self.writer.flush()
+
+    def close(self) -> None:
+        """Leave the shared writer open for the other organizations."""
+
+
+def sync_organizations(config: dict, state: dict, catalog: Catalog) -> None:
+    """Sync the organizations of the config concurrently.
+
+    Every organization in the organizations list of the config, with its
+    organization_id and shopify_partners_server_token, is synced in its own
+    thread with its own client and rate limiter. The clients share one
+    HTTP/2 connection pool. The state has a partition per organization,
+    under organizations, an organization without one starts from the
+    bookmarks of the state. The Singer messages or shards of all
+    organizations are written by one writer, the Parquet files of every
+    organization by its own writer, under organization_id=<id>.
+
+    Arguments:
+        config {dict} -- Tap config
+        state {dict} -- Tap state
+        catalog {Catalog} -- Stream catalog
+
+    Raises:
+        ValueError: When a local mirror is configured
+    """
+    if config.get('mirror_path'):
+        raise ValueError('A local mirror is not supported for organizations.')
+
+    organizations: list = config['organizations']
+    state.setdefault('organizations', {})
+    shared_client: httpx.Client = httpx.Client(http2=True)
+    if config.get('replay_path'):
+        shared_client = ReplayClient(
+            config['replay_path'],
+            float(config.get('replay_speed', 1)),
+        )
+    elif config.get('record_path'):
+        shared_client = RecordingClient(shared_client, config['record_path'])
+    writer: writers.SingerWriter = writers.create_writer(
+        {**config, 'parquet_directory': None},
+    )
+    lock: threading.Lock = threading.Lock()
+
+    def sync_organization(organization: dict) -> None:  # noqa: WPS430
+        organization_id: str = str(organization['organization_id'])
+        LOGGER.info(f'Syncing organization: {organization_id}')
+
+        organization_state: dict = copy.deepcopy(
+            state['organizations'].get(organization_id)
+            or {'bookmarks': state.get('bookmarks', {})},
+        )
+
+        organization_writer: writers.SingerWriter = OrganizationWriter(
+            writer,
+            organization_id,
+            state,
+            lock,
+        )
+        if config.get('parquet_directory'):
+            organization_writer = writers.ParquetWriter(
+                organization_writer,
+                os.path.join(
+                    config['parquet_directory'],
+                    f'{ORGANIZATION_ID}={organization_id}',
+                ),
+                int(config.get('parquet_batch_size', 10000)),
+            )
+
+        # Records are encoded by the shared writer, each organization keeps
+        # its own dedup index
+        organization_config: dict = {**config, 'transform_workers': 0}
+        if config.get('dedup_index_path'):
+            organization_config['dedup_index_path'] = (
+                f'{config["dedup_index_path"]}.{organization_id}'
+            )
+
+        sync(
+            create_client(
+                {**config, 'replay_path': None, 'record_path': None},
+                organization,
+                client=shared_client,
+            ),
+            organization_state,
+            catalog,
+            config['start_date'],
+            organization_config,
+            writer=organization_writer,
+        )
+        organization_writer.close()
+
+    try:
+        with ThreadPoolExecutor(
+            int(config.get('organization_workers', len(organizations))),
+        ) as executor:
+            # Wait for all organizations, raising the error of any of them
+            list(executor.map(sync_organization, organizations))
+    finally:
+        writer.close()
+        shared_client.close()
@@ -0,0 +1,135 @@
+"""Dynamic page size."""
+# -*- coding: utf-8 -*-
+import logging
+
+import singer
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+# Largest page the Partner API returns
+MAX_PAGE_SIZE: int = 100
+
+# Smallest page worth a request
+MIN_PAGE_SIZE: int = 10
+
+
+class PageSizer(object):
+    """Choose the page size of every query from the observed responses.
+
+    Every query starts at the maximum page size. After every request, the
+    page size is scaled towards the largest size that would have stayed
+    within the target duration, the target response size and the target
+    GraphQL query cost, at most halving or doubling it at once. A throttled
+    request halves the page size, as smaller pages cost less of the query
+    cost budget.
+    """
+
+    def __init__(
+        self,
+        target_seconds: float = 2,
+        max_size: int = MAX_PAGE_SIZE,
+        min_size: int = MIN_PAGE_SIZE,
+        target_bytes: int = 0,
+        target_cost: float = 0,
+    ) -> None:
+        """Initialize page sizer.
+
+        Keyword Arguments:
+            target_seconds {float} -- Target duration of a request, 0 does
+                not size the pages by duration (default: {2})
+            max_size {int} -- Maximum page size (default: {MAX_PAGE_SIZE})
+            min_size {int} -- Minimum page size (default: {MIN_PAGE_SIZE})
+            target_bytes {int} -- Target size of a response, 0 does not size
+                the pages by response size (default: {0})
+            target_cost {float} -- Target query cost of a request, 0 does not
+                size the pages by query cost (default: {0})
+        """
+        self.targets: tuple = (target_seconds, target_bytes, target_cost)
+        self.max_size: int = max_size
+        self.min_size: int = min(min_size, max_size)
+        self.sizes: dict = {}
+
+    def size(self, query_name: str) -> int:
+        """Return the page size of the next request of a query.
+
+        Arguments:
+            query_name {str} -- Name of the query
+
+        Returns:
+            int -- Page size
+        """
+        return self.sizes.get(query_name, self.max_size)
+
+    def observe(  # noqa: WPS211
+        self,
+        query_name: str,
+        seconds: float,
+        records: int,
+        size: int,
+        response_bytes: int = 0,
+        query_cost: float = 0,
+    ) -> None:
+        """Adjust the page size of a query to a response.
+
+        Every measure of the response with a target scales the page size,
+        the measure furthest over its target decides.
+
+        Arguments:
+            query_name {str} -- Name of the query
+            seconds {float} -- Duration of the request
+            records {int} -- Records in the response
+            size {int} -- Page size of the request
+
+        Keyword Arguments:
+            response_bytes {int} -- Size of the response body (default: {0})
+            query_cost {float} -- GraphQL query cost of the request, when the
+                API reports it (default: {0})
+        """
+        # Only full pages tell what a page of this size takes
+        if records < size:
+            return
+
+        scales: list = [
+            target / measure
+            for target, measure in zip(
+                self.targets,
+                (seconds, response_bytes, query_cost),
+            )
+            if target and measure > 0
+        ]
+        if not scales:
+            return
+
+        scale: float = min(2, max(0.5, min(scales)))
+        self._set(query_name, int(size * scale))
+
+    def throttled(self, query_name: str) -> None:
+        """Halve the page size of a query after a throttled request.
+
+        Arguments:
+            query_name {str} -- Name of the query
+        """
+        self._set(query_name, self.size(query_name) // 2)
+
+    def shrink(self) -> None:
+        """Halve the maximum page size of all queries, to save memory."""
+        max_size: int = max(self.min_size, self.max_size // 2)
+        if max_size != self.max_size:
+            LOGGER.info(f'Maximum page size: {self.max_size} -> {max_size}')
+        self.max_size = max_size
+        for query_name, size in list(self.sizes.items()):
+            self._set(query_name, size)
+
+    def _set(self, query_name: str, size: int) -> None:
+        """Set the page size of a query within the limits and log changes.
+
+        Arguments:
+            query_name {str} -- Name of the query
+            size {int} -- New page size
+        """
+        size = min(self.max_size, max(self.min_size, size))
+        if size != self.size(query_name):
+            LOGGER.info(
+                f'Page size of {query_name}: {self.size(query_name)} -> {size}',
+            )
+        self.sizes[query_name] = size
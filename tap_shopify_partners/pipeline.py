@@ -0,0 +1,130 @@
+"""Staged pipeline."""
+# -*- coding: utf-8 -*-
+import queue
+import threading
+from typing import Any, Callable, Generator, Iterable, Optional
+
+# Marker of the last chunk of an iterable
+_DONE: object = object()
+
+# Seconds between checks whether the consumer stopped, while the queue is full
+_PUT_TIMEOUT: float = 0.1
+
+
+def prefetch(
+    iterable: Iterable,
+    max_size: int,
+    chunk_size: int = 1,
+) -> Generator[Any, None, None]:
+    """Iterate over an iterable in a background thread.
+
+    The thread runs ahead of the consumer, e.g. fetches the next page while
+    the previous one is cleaned, by at most max_size chunks of chunk_size
+    items. When the queue is full the thread waits, so a slow consumer slows
+    down the producer instead of buffering everything. Errors of the
+    iterable are raised in the consumer. When the consumer stops early, the
+    thread stops putting chunks, closes the iterable and is joined, so no
+    thread is left blocked on the full queue.
+
+    Arguments:
+        iterable {Iterable} -- Items to produce in the background
+        max_size {int} -- Maximum chunks in the queue, 0 iterates without a
+            background thread
+
+    Keyword Arguments:
+        chunk_size {int} -- Items per chunk (default: {1})
+
+    Raises:
+        BaseException: The error of the iterable
+
+    Yields:
+        Generator[Any] -- The items of the iterable
+    """
+    if max_size <= 0:
+        yield from iterable
+        return
+
+    items: queue.Queue = queue.Queue(max_size)
+    stop: threading.Event = threading.Event()
+    producer: threading.Thread = threading.Thread(
+        target=_produce,
+        args=(iterable, items, chunk_size, stop),
+        daemon=True,
+    )
+    producer.start()
+
+    try:
+        while True:
+            chunk, end = items.get()
+            yield from chunk
+            if end is _DONE:
+                return
+            if end is not None:
+                raise end
+    finally:
+        stop.set()
+        producer.join()
+
+
+def _produce(
+    iterable: Iterable,
+    items: queue.Queue,
+    chunk_size: int,
+    stop: threading.Event,
+) -> None:
+    """Put the items of an iterable in the queue, chunk by chunk.
+
+    The last chunk is put with the marker _DONE, or with the error of the
+    iterable. The iterable is closed when the consumer stopped early, from
+    this thread, which runs it.
+
+    Arguments:
+        iterable {Iterable} -- Items to produce
+        items {queue.Queue} -- Queue of chunks
+        chunk_size {int} -- Items per chunk
+        stop {threading.Event} -- Set when the consumer stopped
+    """
+    chunk: list = []
+    try:
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                if not _put(items, (chunk, None), stop):
+                    _close(iterable)
+                    return
+                chunk = []
+    except BaseException as error:  # noqa: WPS424
+        _put(items, (chunk, error), stop)
+        return
+    _put(items, (chunk, _DONE), stop)
+
+
+def _close(iterable: Iterable) -> None:
+    """Close an iterable that can be closed, such as a generator.
+
+    Arguments:
+        iterable {Iterable} -- Iterable
+    """
+    close: Optional[Callable] = getattr(iterable, 'close', None)
+    if close is not None:
+        close()
+
+
+def _put(items: queue.Queue, chunk: tuple, stop: threading.Event) -> bool:
+    """Put a chunk in the queue, unless the consumer stopped.
+
+    Arguments:
+        items {queue.Queue} -- Queue of chunks
+        chunk {tuple} -- Chunk of items and its end marker
+        stop {threading.Event} -- Set when the consumer stopped
+
+    Returns:
+        bool -- Whether the chunk was put in the queue
+    """
+    while not stop.is_set():
+        try:
+            items.put(chunk, timeout=_PUT_TIMEOUT)
+        except queue.Full:
+            continue
+        return True
+    return False
@@ -6,7 +6,7 @@ from types import MappingProxyType
 QUERIES: MappingProxyType = MappingProxyType({
     'app_subscription_sale': """
 query {
-  transactions(types: [APP_SUBSCRIPTION_SALE], createdAtMin:":fromdate:", createdAtMax:":todate:", first: 100, after: ":cursor:") {
+  transactions(types: [APP_SUBSCRIPTION_SALE], createdAtMin:":fromdate:", createdAtMax:":todate:", first: :first:, after: ":cursor:") {
     pageInfo{
         hasNextPage
     }
@@ -47,7 +47,7 @@ query {
     """,
   'app_sale_adjustment': """
 query {
-  transactions(types: [APP_SALE_ADJUSTMENT], createdAtMin:":fromdate:", createdAtMax:":todate:", first: 100, after: ":cursor:") {
+  transactions(types: [APP_SALE_ADJUSTMENT], createdAtMin:":fromdate:", createdAtMax:":todate:", first: :first:, after: ":cursor:") {
     pageInfo{
         hasNextPage
     }
@@ -96,7 +96,7 @@ query {
       				CREDIT_PENDING],
       occurredAtMin: ":fromdate:"
       occurredAtMax: ":todate:"
-      first: 100
+      first: :first:
       after: ":cursor:"
     ) {
       pageInfo{
@@ -154,6 +154,31 @@ query {
     }
   }
 }
+    """,
+    'transactions_probe': """
+  :alias:: transactions(types: [:types:], createdAtMin:":fromdate:", createdAtMax:":todate:", first: 1) {
+    edges {
+      node {
+        id
+      }
+    }
+  }
+    """,
+    'app_events_probe': """
+  :alias:: app(id: "gid://partners/App/4842809") {
+    events(
+      types: [:types:],
+      occurredAtMin: ":fromdate:"
+      occurredAtMax: ":todate:"
+      first: 1
+    ) {
+      edges {
+        node {
+          type
+        }
+      }
+    }
+  }
     """,
     'app_relationship': """
 {
@@ -167,7 +192,7 @@ query {
       				RELATIONSHIP_UNINSTALLED],
       occurredAtMin: ":fromdate:"
       occurredAtMax: ":todate:"
-      first: 100
+      first: :first:
       after: ":cursor:"
     ) {
       pageInfo{
@@ -204,7 +229,7 @@ query {
       types: [SUBSCRIPTION_CHARGE_ACCEPTED, SUBSCRIPTION_CHARGE_ACTIVATED, SUBSCRIPTION_CHARGE_CANCELED, SUBSCRIPTION_CHARGE_DECLINED, SUBSCRIPTION_CHARGE_EXPIRED, SUBSCRIPTION_CHARGE_FROZEN, SUBSCRIPTION_CHARGE_UNFROZEN]
       occurredAtMin: ":fromdate:"
       occurredAtMax: ":todate:"
-      first: 100
+      first: :first:
       after: ":cursor:"
     ) {
       pageInfo{
@@ -315,5 +340,192 @@ query {
 }
 
     """,
+    'transactions_demux': """
+query {
+  transactions(types: [:types:], createdAtMin:":fromdate:", createdAtMax:":todate:", first: :first:, after: ":cursor:") {
+    pageInfo{
+        hasNextPage
+    }
+    edges {
+      cursor
+      node {
+        __typename
+        id
+        createdAt
+        ... on AppSubscriptionSale {
+          netAmount {
+            amount
+            currencyCode
+          }
+          grossAmount{
+            amount
+            currencyCode
+          }
+          shopifyFee{
+            amount
+            currencyCode
+          }
+          app {
+            id
+            name
+          }
+          shop {
+            myshopifyDomain
+            name
+            id
+          }
+          billingInterval
+          chargeId
+        }
+        ... on AppSaleAdjustment {
+          netAmount {
+            amount
+            currencyCode
+          }
+          grossAmount{
+            amount
+            currencyCode
+          }
+          shopifyFee{
+            amount
+            currencyCode
+          }
+          app {
+            id
+            name
+          }
+          shop {
+            myshopifyDomain
+            name
+            id
+          }
+          chargeId
+        }
+      }
+    }
+  }
+}
+    """,
+    'app_events_demux': """
+{
+  app(id: "gid://partners/App/4842809") {
+    events(
+      types: [:types:]
+      occurredAtMin: ":fromdate:"
+      occurredAtMax: ":todate:"
+      first: :first:
+      after: ":cursor:"
+    ) {
+      pageInfo{
+        hasNextPage
+      }
+      edges {
+        cursor
+        node {
+          app {
+            name
+            id
+          }
+          occurredAt
+          shop {
+            id
+            name
+            myshopifyDomain
+          }
+          type
+          ... on RelationshipUninstalled {
+            description
+            reason
+          }
+          ... on SubscriptionChargeAccepted {
+            charge {
+              amount {
+                amount
+                currencyCode
+              }
+              billingOn
+              id
+              name
+              test
+            }
+          }
+          ... on SubscriptionChargeActivated {
+            charge {
+              amount {
+                amount
+                currencyCode
+              }
+              billingOn
+              id
+              name
+              test
+            }
+          }
+          ... on SubscriptionChargeCanceled {
+            charge {
+              amount {
+                amount
+                currencyCode
+              }
+              billingOn
+              id
+              name
+              test
+            }
+          }
+          ... on SubscriptionChargeDeclined {
+            charge {
+              amount {
+                amount
+                currencyCode
+              }
+              billingOn
+              id
+              name
+              test
+            }
+          }
+          ... on SubscriptionChargeExpired {
+            charge {
+              amount {
+                amount
+                currencyCode
+              }
+              billingOn
+              id
+              name
+              test
+            }
+          }
+          ... on SubscriptionChargeFrozen {
+            charge {
+              amount {
+                amount
+                currencyCode
+              }
+              billingOn
+              id
+              name
+              test
+            }
+          }
+          ... on SubscriptionChargeUnfrozen {
+            charge {
+              amount {
+                amount
+                currencyCode
+              }
+              billingOn
+              id
+              name
+              test
+            }
+          }
+        }
+      }
+    }
+  }
+}
+    """,
 })
 
@@ -0,0 +1,49 @@
+"""Request rate limiting."""
+# -*- coding: utf-8 -*-
+import threading
+import time
+from typing import Any, Optional
+
+
+class _Value(object):
+    """Holder of the next request time when the schedule is not shared."""
+
+    def __init__(self) -> None:
+        """Initialize value."""
+        self.value: float = 0
+
+
+class RateLimiter(object):
+    """Space the start of requests at least interval seconds apart.
+
+    The schedule can be shared between processes by passing a shared value
+    and lock, i.e. multiprocessing.Value('d') and multiprocessing.Lock(), so
+    all processes together stay within one request budget.
+    """
+
+    def __init__(
+        self,
+        interval: float = 2,
+        next_request: Optional[Any] = None,
+        lock: Optional[Any] = None,
+    ) -> None:
+        """Initialize rate limiter.
+
+        Keyword Arguments:
+            interval {float} -- Minimum seconds between requests (default: {2})
+            next_request {Optional[Any]} -- Shared time of the next request
+                (default: {None})
+            lock {Optional[Any]} -- Lock of the shared time (default: {None})
+        """
+        self.interval: float = interval
+        self.next_request: Any = next_request or _Value()
+        self.lock: Any = lock or threading.Lock()
+
+    def wait(self) -> None:
+        """Wait until the next request may start and reserve its slot."""
+        with self.lock:
+            now: float = time.time()
+            start: float = max(now, self.next_request.value)
+            self.next_request.value = start + self.interval
+        if start > now:
+            time.sleep(start - now)
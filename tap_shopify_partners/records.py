@@ -0,0 +1,52 @@
+"""Record types."""
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Callable
+
+from tap_shopify_partners.streams import STREAMS
+
+
+def _record_type(tap_stream_id: str, stream: dict) -> type:
+    """Create the record type of a stream from its mapping.
+
+    The record type is a named tuple, so records have a fixed layout without
+    a dictionary per record. The fields are the mapped names in the order of
+    the mapping.
+
+    Arguments:
+        tap_stream_id {str} -- Stream id
+        stream {dict} -- Stream metadata
+
+    Returns:
+        type -- Record type
+    """
+    type_name: str = ''.join(
+        word.capitalize() for word in tap_stream_id.split('_')
+    )
+    fields: list = [
+        key_mapping.get('map') or key
+        for key, key_mapping in stream['mapping'].items()
+    ]
+    return namedtuple(type_name, fields, module=__name__)
+
+
+# Record type of every stream
+RECORD_TYPES: MappingProxyType = MappingProxyType({
+    tap_stream_id: _record_type(tap_stream_id, stream)
+    for tap_stream_id, stream in STREAMS.items()
+})
+
+
+def sort_key(tap_stream_id: str) -> Callable:
+    """Return the key to sort records of the stream by replication key.
+
+    Arguments:
+        tap_stream_id {str} -- Stream id
+
+    Returns:
+        Callable -- Getter of the replication key by position
+    """
+    fields: tuple = RECORD_TYPES[tap_stream_id]._fields
+    return itemgetter(fields.index(STREAMS[tap_stream_id]['replication_key']))
@@ -0,0 +1,210 @@
+"""Request recording and replay."""
+# -*- coding: utf-8 -*-
+import atexit
+import gzip
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import IO, Any
+
+import httpx
+import singer
+
+from tap_shopify_partners import timestamps
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+# Response headers that are recorded
+RECORDED_HEADERS: tuple = ('content-type', 'retry-after')
+
+# Page size argument of a query, that depends on the latency when recorded
+PAGE_SIZE_ARGUMENT: re.Pattern = re.compile(r'first: \d+')
+
+
+def request_key(url: str, data: Any) -> tuple:
+    """Return the key of a request, without its page size.
+
+    Arguments:
+        url {str} -- URL
+        data {Any} -- Request body
+
+    Returns:
+        tuple -- URL and request body with every page size replaced
+    """
+    if isinstance(data, str):
+        data = PAGE_SIZE_ARGUMENT.sub('first: _', data)
+    return (url, data)
+
+
+class RecordingClient(object):
+    """HTTP client that records every request and response.
+
+    The requests are passed on to another client. Every request body and its
+    response, with the duration of the request, is appended as a JSON line
+    to a gzip file. The request headers, with the access token, are not
+    recorded. Every current time the tap asks for, that ends the last window
+    of a query, is recorded as well, so a replay sends the same requests.
+    """
+
+    def __init__(self, client: httpx.Client, path: str) -> None:
+        """Initialize client.
+
+        Arguments:
+            client {httpx.Client} -- Client to pass the requests on to
+            path {str} -- Path of the recording
+        """
+        self.client: httpx.Client = client
+        self.recording: IO[str] = gzip.open(path, 'wt')
+        self.lock: threading.Lock = threading.Lock()
+        self.start: float = time.monotonic()
+        atexit.register(self.close)
+
+    def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a POST request and record it with its response.
+
+        Arguments:
+            url {str} -- URL
+
+        Keyword Arguments:
+            kwargs {Any} -- Arguments of httpx.Client.post
+
+        Returns:
+            httpx.Response -- Response
+        """
+        request_start: float = time.monotonic()
+        response: httpx.Response = self.client.post(url, **kwargs)
+        elapsed: float = time.monotonic() - request_start
+
+        line: str = json.dumps({
+            'offset': request_start - self.start,
+            'elapsed': elapsed,
+            'url': url,
+            'data': kwargs.get('data'),
+            'status_code': response.status_code,
+            'headers': {
+                header: response.headers[header]
+                for header in RECORDED_HEADERS
+                if header in response.headers
+            },
+            'content': response.text,
+        })
+        self._write(line)
+        return response
+
+    def now(self) -> int:
+        """Return and record the current time.
+
+        Returns:
+            int -- Epoch microseconds
+        """
+        current_time: int = timestamps.now()
+        self._write(json.dumps({'now': current_time}))
+        return current_time
+
+    def _write(self, line: str) -> None:
+        """Append a line to the recording.
+
+        Arguments:
+            line {str} -- JSON line
+        """
+        with self.lock:
+            self.recording.write(line)
+            self.recording.write('\n')
+
+    def close(self) -> None:
+        """Close the recording and the client."""
+        with self.lock:
+            if not self.recording.closed:
+                self.recording.close()
+        self.client.close()
+
+
+class ReplayClient(object):
+    """HTTP client that replays the responses of a recording.
+
+    The response of a request is the next recorded response of the same URL
+    and request body, ignoring the page size. The page size of a query
+    follows the latency of its requests, so the page sizes of the replay may
+    differ from the recording, the replay follows the recorded pages and
+    their cursors instead. The responses take their recorded duration divided by
+    the speed, a speed of 0 returns them immediately. The current time is
+    the next recorded time, so the windows end where they did when recorded.
+    """
+
+    def __init__(self, path: str, speed: float = 1) -> None:
+        """Initialize client.
+
+        Arguments:
+            path {str} -- Path of the recording
+
+        Keyword Arguments:
+            speed {float} -- Speed relative to the recording (default: {1})
+        """
+        self.speed: float = speed
+        self.responses: defaultdict = defaultdict(deque)
+        self.times: deque = deque()
+        self.lock: threading.Lock = threading.Lock()
+
+        with gzip.open(path, 'rt') as recording:
+            for line in recording:
+                exchange: dict = json.loads(line)
+                if 'now' in exchange:
+                    self.times.append(exchange['now'])
+                    continue
+                self.responses[
+                    request_key(exchange['url'], exchange['data'])
+                ].append(exchange)
+        LOGGER.info(f'Replaying {path} at speed {speed}')
+
+    def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Return the recorded response of a POST request.
+
+        Arguments:
+            url {str} -- URL
+
+        Keyword Arguments:
+            kwargs {Any} -- Arguments of httpx.Client.post
+
+        Raises:
+            ValueError: When the request is not in the recording
+
+        Returns:
+            httpx.Response -- Recorded response
+        """
+        with self.lock:
+            exchanges: deque = self.responses[
+                request_key(url, kwargs.get('data'))
+            ]
+            if not exchanges:
+                raise ValueError(f'No recorded response for request: {url}')
+            exchange: dict = exchanges.popleft()
+
+        if self.speed:
+            time.sleep(exchange['elapsed'] / self.speed)
+
+        return httpx.Response(
+            exchange['status_code'],
+            headers=exchange['headers'],
+            content=exchange['content'].encode('utf-8'),
+            request=httpx.Request('POST', url),
+        )
+
+    def now(self) -> int:
+        """Return the next recorded current time.
+
+        Raises:
+            ValueError: When all recorded times were returned
+
+        Returns:
+            int -- Epoch microseconds
+        """
+        with self.lock:
+            if not self.times:
+                raise ValueError('No recorded current time left to replay')
+            return self.times.popleft()
+
+    def close(self) -> None:
+        """Close the client."""
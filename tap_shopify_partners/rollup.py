@@ -0,0 +1,113 @@
+"""Daily revenue rollup."""
+# -*- coding: utf-8 -*-
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
+
+from singer.catalog import CatalogEntry
+
+from tap_shopify_partners import timestamps, writers
+from tap_shopify_partners.streams import DERIVED_STREAMS
+
+DAILY_REVENUE: str = 'shopify_partners_daily_revenue'
+
+# Amount fields of the transactions that are summed
+AMOUNTS: tuple = ('gross_amount', 'net_amount', 'shopify_fee')
+
+
+class DailyRevenue(object):
+    """Sum the transactions per day, app, currency and transaction type.
+
+    The totals are computed from the records of the transaction streams as
+    they are synced. The totals of a day are written once the records of
+    the stream pass to the next day, and the totals of the last day when the
+    rollup is closed. Those of the last day are also kept in the state, next
+    to the bookmark, so the next sync adds to them. The totals are keyed by
+    day, so a target upserts the totals of a day that were written before.
+    """
+
+    def __init__(
+        self,
+        state: dict,
+        writer: writers.SingerWriter,
+        stream: CatalogEntry,
+    ) -> None:
+        """Initialize rollup.
+
+        Arguments:
+            state {dict} -- Tap state, with the totals of the open days
+            writer {SingerWriter} -- Output writer
+            stream {CatalogEntry} -- Stream catalog of the rollup
+        """
+        self.sources: dict = DERIVED_STREAMS[DAILY_REVENUE]['sources']
+        self.open_days: dict = state.setdefault('daily_revenue', {})
+        self.writer: writers.SingerWriter = writer
+        self.stream: CatalogEntry = stream
+
+        writer.write_schema(
+            stream_name=stream.tap_stream_id,
+            schema=stream.schema.to_dict(),
+            key_properties=stream.key_properties,
+        )
+
+    def add(self, tap_stream_id: str, row: tuple) -> None:
+        """Add a transaction to the totals of its day.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id of the transaction
+            row {tuple} -- Transaction of the stream's record type
+        """
+        if tap_stream_id not in self.sources:
+            return
+
+        day: str = timestamps.format_day(
+            timestamps.parse_timestamp(row.created_at),
+        )
+        open_day: Optional[dict] = self.open_days.get(tap_stream_id)
+        if open_day is None or open_day['day'] != day:
+            if open_day is not None:
+                self._write(tap_stream_id)
+            open_day = {'day': day, 'totals': {}}
+            self.open_days[tap_stream_id] = open_day
+
+        totals: dict = open_day['totals'].setdefault(row.app_id, {}).setdefault(
+            row.net_amount_currency_code,
+            {'app': row.app, 'count': 0, **dict.fromkeys(AMOUNTS, '0')},
+        )
+        totals['count'] += 1
+        for amount in AMOUNTS:
+            row_amount: Optional[str] = getattr(row, amount)
+            if row_amount is not None:
+                totals[amount] = format(
+                    Decimal(totals[amount]) + Decimal(row_amount),
+                    'f',
+                )
+
+    def close(self) -> None:
+        """Write the totals of the open day of every transaction stream."""
+        for tap_stream_id in self.open_days:
+            self._write(tap_stream_id)
+
+    def _write(self, tap_stream_id: str) -> None:
+        """Write the totals of the open day of a transaction stream.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id of the transactions
+        """
+        open_day: dict = self.open_days[tap_stream_id]
+        time_extracted: datetime = datetime.now(timezone.utc)
+        for app_id, currencies in open_day['totals'].items():
+            for currency, totals in currencies.items():
+                self.writer.write_record(
+                    self.stream.tap_stream_id,
+                    {
+                        'day': open_day['day'],
+                        'app_id': app_id,
+                        'app': totals['app'],
+                        'currency': currency,
+                        'type': self.sources[tap_stream_id],
+                        **{amount: totals[amount] for amount in AMOUNTS},
+                        'count': totals['count'],
+                    },
+                    time_extracted=time_extracted,
+                )
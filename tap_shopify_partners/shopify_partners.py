@@ -2,19 +2,23 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from datetime import datetime, timedelta, timezone, date
+import threading
+import time
 from types import MappingProxyType
-from typing import Generator, Optional, Callable
+from typing import Callable, Generator, Iterable, Optional
 
 import httpx
 import singer
-import time
-import collections
-from dateutil.parser import isoparse
-from dateutil.rrule import DAILY, rrule
 
-from tap_shopify_partners.cleaners import CLEANERS
+from tap_shopify_partners import memory, records, timestamps
+from tap_shopify_partners.cleaners import InternTable, clean_page
+from tap_shopify_partners.extsort import ExternalSort
+from tap_shopify_partners.pagesize import MAX_PAGE_SIZE, PageSizer
+from tap_shopify_partners.pipeline import prefetch
 from tap_shopify_partners.queries import QUERIES
+from tap_shopify_partners.ratelimit import RateLimiter
+from tap_shopify_partners.replay import RecordingClient, ReplayClient
+from tap_shopify_partners.streams import STREAMS
 
 API_SCHEME: str = 'https://'
 API_BASE_URL: str = 'partners.shopify.com/'
@@ -27,6 +31,94 @@ HEADERS: MappingProxyType = MappingProxyType({  # Frozen dictionary
     'X-Shopify-Access-Token': ':token:',
 })
 
+# Status code of a throttled request and how often to retry it
+HTTP_TOO_MANY_REQUESTS: int = 429
+THROTTLED_RETRIES: int = 5
+
+def create_client(
+    config: dict,
+    organization: Optional[dict] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    client: Optional[httpx.Client] = None,
+) -> 'Shopify':
+    """Create a Shopify Partners client from the tap config.
+
+    Arguments:
+        config {dict} -- Tap config
+
+    Keyword Arguments:
+        organization {Optional[dict]} -- Organization with its
+            organization_id and shopify_partners_server_token, the
+            organization of the config when not given (default: {None})
+        rate_limiter {Optional[RateLimiter]} -- Rate limiter of the requests,
+            one of request_interval seconds when not given, none when
+            replaying (default: {None})
+        client {Optional[httpx.Client]} -- Shared HTTP client
+            (default: {None})
+
+    Returns:
+        Shopify -- Shopify Partners client
+    """
+    organization = organization or config
+    max_page_size: int = int(config.get('max_page_size', MAX_PAGE_SIZE))
+    page_sizer: PageSizer = PageSizer(
+        float(config.get('page_target_seconds', 2)),
+        max_page_size,
+        target_bytes=int(
+            float(config.get('page_target_mb', 8)) * memory.MEGABYTE,
+        ),
+        target_cost=float(config.get('page_target_cost', 0)),
+    )
+
+    # Replay the responses of a recording, or record the responses
+    if config.get('replay_path'):
+        client = ReplayClient(
+            config['replay_path'],
+            float(config.get('replay_speed', 1)),
+        )
+
+        # The recorded responses set the pace and the pages of a replay
+        rate_limiter = RateLimiter(0)
+        page_sizer = PageSizer(0, max_page_size)
+    elif config.get('record_path'):
+        client = RecordingClient(
+            client or httpx.Client(http2=True),
+            config['record_path'],
+        )
+    return Shopify(
+        organization['organization_id'],
+        organization.get('shopify_partners_server_token', ''),
+        intern_table_size=int(config.get('intern_table_size', 100000)),
+        rate_limiter=rate_limiter or RateLimiter(
+            float(config.get('request_interval', 2)),
+        ),
+        sparse_streams=config.get('sparse_streams'),
+        page_sizer=page_sizer,
+        prefetch_pages=int(config.get('prefetch_pages', 0)),
+        sort_buffer_size=int(config.get('sort_buffer_size', 0)),
+        client=client,
+        memory_budget=memory.MemoryBudget(
+            int(float(config['memory_budget']) * memory.MEGABYTE),
+            bool(config.get('trace_memory_stages')),
+        ) if config.get('memory_budget') else None,
+    )
+
+
+def _query_cost(response_json: dict) -> float:
+    """Return the GraphQL query cost of a response.
+
+    Arguments:
+        response_json {dict} -- Response body
+
+    Returns:
+        float -- Actual, or else requested, query cost, 0 when the API did not
+            report it
+    """
+    cost: dict = response_json.get('extensions', {}).get('cost') or {}
+    return float(
+        cost.get('actualQueryCost') or cost.get('requestedQueryCost') or 0,
+    )
+
 class Shopify(object):  # noqa: WPS230
     """Shopify Partners API Client."""
 
@@ -34,411 +126,715 @@ class Shopify(object):  # noqa: WPS230
         self,
         organization_id: str,
         shopify_partners_access_token: str,
+        intern_table_size: int = 100000,
+        rate_limiter: Optional[RateLimiter] = None,
+        sparse_streams: Optional[Iterable[str]] = None,
+        page_sizer: Optional[PageSizer] = None,
+        prefetch_pages: int = 0,
+        sort_buffer_size: int = 0,
+        client: Optional[httpx.Client] = None,
+        memory_budget: Optional[memory.MemoryBudget] = None,
     ) -> None:
         """Initialize client.
 
         Arguments:
             organization_id {str} -- Shopify Partners organization id
             shopify_partners_access_token {str} -- Shopify Partners Server Token
+
+        Keyword Arguments:
+            intern_table_size {int} -- Maximum number of shared repeated
+                values, such as apps and shops (default: {100000})
+            rate_limiter {Optional[RateLimiter]} -- Rate limiter of the
+                requests, a request every 2 seconds when not given
+                (default: {None})
+            sparse_streams {Optional[Iterable[str]]} -- Streams to probe
+                for empty days before querying them, none when not given
+                (default: {None})
+            page_sizer {Optional[PageSizer]} -- Page sizer of the queries,
+                aiming at 2 seconds per request when not given
+                (default: {None})
+            prefetch_pages {int} -- Pages to fetch ahead in a background
+                thread while the previous pages are cleaned, 0 fetches a page
+                only when it is needed (default: {0})
+            sort_buffer_size {int} -- Maximum records of a day to sort in
+                memory, more records are sorted in runs on disk, 0 sorts
+                every day in memory (default: {0})
+            client {Optional[httpx.Client]} -- HTTP client, shared with the
+                clients of other organizations, a new HTTP/2 client when not
+                given (default: {None})
+            memory_budget {Optional[MemoryBudget]} -- Memory budget to
+                shrink the pages and day buffers for when the memory use
+                nears it (default: {None})
         """
         self.organization_id: str = organization_id
         self.shopify_partners_access_token: str = shopify_partners_access_token
         self.logger: logging.Logger = singer.get_logger()
-        self.client: httpx.Client = httpx.Client(http2=True)
-
-    def flatten(
-        self,
-        dictionary, 
-        parent_key=False, 
-        separator='.'):
-        """
-        Turn a nested dictionary into a flattened dictionary
-        :param dictionary: The dictionary to flatten
-        :param parent_key: The string to prepend to dictionary's keys
-        :param separator: The string used to separate flattened keys
-        :return: A flattened dictionary
-        """
-        items = []
-        for key, value in dictionary.items():
-            new_key = str(parent_key) + separator + key if parent_key else key
-            if isinstance(value, collections.MutableMapping):
-                items.extend(self.flatten(value, new_key, separator).items())
-            elif isinstance(value, list):
-                for k, v in enumerate(value):
-                    items.extend(self.flatten({str(k): v}, new_key).items())
-            else:
-                items.append((new_key, value))
-        return dict(items)
-
-    def shopify_partners_app_subscription_sale(  # noqa: WPS210, WPS213
+        self.client: httpx.Client = client or httpx.Client(http2=True)
+        self.intern_table: InternTable = InternTable(intern_table_size)
+        self.rate_limiter: RateLimiter = rate_limiter or RateLimiter()
+        self.page_sizer: PageSizer = page_sizer or PageSizer()
+        self.prefetch_pages: int = prefetch_pages
+        self.sort_buffer_size: int = sort_buffer_size
+        self.memory_budget: Optional[memory.MemoryBudget] = memory_budget
+        self.sparse_streams: frozenset = frozenset(sparse_streams or ())
+
+    def shopify_partners_app_subscription_sale(
         self,
         **kwargs: dict,
-    ) -> Generator[dict, None, None]:
+    ) -> Generator[tuple, None, None]:
         """Shopify Partners app subscription history
 
         Raises:
             ValueError: When the parameter start_date is missing
 
         Yields:
-            Generator[dict] -- Yields Shopify Partners app subscription sales
+            Generator[tuple] -- Yields Shopify Partners app subscription sales
         """
         self.logger.info('Stream Shopify Partners App Subscription Sales')
-
-        # Validate the start_date value exists
-        start_date_input: str = str(kwargs.get('start_date', ''))
-
-        if not start_date_input:
-            raise ValueError('The parameter start_date is required.')
-
-        # Set start date and end date
-        start_date: datetime = isoparse(start_date_input)
-        end_date: datetime = datetime.now(timezone.utc).replace(microsecond=0)
-
-        self.logger.info(
-            f'Retrieving app subscription sales data from {start_date} to {end_date}',
+        yield from self._stream_days(
+            'shopify_partners_app_subscription_sale',
+            **kwargs,
         )
-         # The start date until now function wants a string
-        start_date_string = str(start_date)
-        first_start_date = start_date_string.replace(' ', 'T')
-        # Extra kwargs will be converted to parameters in the API requests
-        # start_date is parsed into batches, thus we remove it from the kwargs
-        kwargs.pop('start_date', None)
-
-        # Build URL
-        org_id: str=API_ORG_ID.replace(':organization_id:', self.organization_id)
-        url: str = (
-            f'{API_SCHEME}{API_BASE_URL}{org_id}'
-            f'{API_VERSION}{API_PATH_CALL_TYPE}'
-        )
-        self._create_headers()
 
-        # For starting with the bookmark value
-        first_run = True
-
-        for date_day in self._start_days_till_now(start_date_string):
-            hasNextPage = True
-            latest_cursor = ""
-            temp_list = []
-
-            # Data is paginated so need to go page by page until false
-            while hasNextPage:
-                query: str = QUERIES['app_subscription_sale']
-                # Replace dates in placeholders
-                if first_run:
-                    query = query.replace(':fromdate:', first_start_date)
-                else:
-                    query = query.replace(':fromdate:', date_day + "T00:00:00.000000Z")
-
-                query = query.replace(':todate:', date_day + "T23:59:59.999999Z")
-                query = query.replace(':cursor:', latest_cursor)
-
-                response: httpx._models.Response = self.client.post(  # noqa
-                    url,
-                    headers=self.headers,
-                    data=query,
-                    )
-                time.sleep(2)
-
-                # Define cleaner:
-                cleaner: Callable = CLEANERS.get('shopify_partners_app_subscription_sale')
+    def shopify_partners_app_sale_adjustment(
+        self,
+        **kwargs: dict,
+    ) -> Generator[tuple, None, None]:
+        """Shopify Partners app sale adjustments (refunds)
 
-                # Raise error on 4xx and 5xxx
-                response.raise_for_status()
+        Raises:
+            ValueError: When the parameter start_date is missing
 
-                # Create dictionary from response
-                response_data: dict = response.json()
-                hasNextPage = response_data['data']['transactions']['pageInfo'].get('hasNextPage')
-                for transaction in response_data['data']['transactions']['edges']:
-                    latest_cursor = transaction.get('cursor')
-                    temp_transaction = self.flatten(transaction)
-                    temp_list.append([temp_transaction])
-                    # yield cleaner(date_day, temp_transaction)
+        Yields:
+            Generator[tuple] -- Yields Shopify Partners app sale adjustment data
+        """
+        self.logger.info('Stream Shopify Partners App Sales Adjustment')
+        yield from self._stream_days(
+            'shopify_partners_app_sale_adjustment',
+            **kwargs,
+        )
 
-            temp_list_sort = sorted(temp_list, key=lambda d: d[0]['node.createdAt'])
+    def shopify_partners_app_relationship(
+        self,
+        **kwargs: dict,
+    ) -> Generator[tuple, None, None]:
+        """Shopify Partners app relationship data (installs/uninstalls)
 
-            for i in temp_list_sort:
-                yield cleaner(date_day, i[0])
+        Raises:
+            ValueError: When the parameter start_date is missing
 
-            first_run = False
+        Yields:
+            Generator[tuple] -- Yields Shopify Partners app relationship data
+        """
+        self.logger.info('Stream Shopify Partners App Relationships')
+        yield from self._stream_days(
+            'shopify_partners_app_relationship',
+            **kwargs,
+        )
 
-        self.logger.info('Finished: shopify_partners_app_subscription_sale')
-    
-    def shopify_partners_app_sale_adjustment(  # noqa: WPS210, WPS213
+    def shopify_partners_app_subscription_charge(
         self,
         **kwargs: dict,
-    ) -> Generator[dict, None, None]:
-        """Shopify Partners app sale adjustments (refunds)
+    ) -> Generator[tuple, None, None]:
+        """Shopify Partners app subscription charge data
 
         Raises:
             ValueError: When the parameter start_date is missing
 
         Yields:
-            Generator[dict] -- Yields Shopify Partners app sale adjustment data
+            Generator[tuple] -- Yields Shopify Partners app subscription charge data
         """
-        self.logger.info('Stream Shopify Partners App Sales Adjustment')
+        self.logger.info('Stream Shopify Partners App Subscription Charges')
+        yield from self._stream_days(
+            'shopify_partners_app_subscription_charge',
+            **kwargs,
+        )
 
-        # Validate the start_date value exists
-        start_date_input: str = str(kwargs.get('start_date', ''))
+    def follow(
+        self,
+        tap_stream_id: str,
+        start_date: str,
+        poll_interval: float,
+        stop: threading.Event,
+    ) -> Generator[list, None, None]:
+        """Yield the new records of a stream, poll after poll, until stopped.
 
-        if not start_date_input:
-            raise ValueError('The parameter start_date is required.')
+        Every poll only queries the window from just after the last record
+        up to now, so a poll without new events is a single small request.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+            start_date {str} -- Start of the first window
+            poll_interval {float} -- Seconds between two polls
+            stop {threading.Event} -- Event to stop following
 
-        # Set start date and end date
-        start_date: datetime = isoparse(start_date_input)
-        end_date: datetime = datetime.now(timezone.utc).replace(microsecond=0)
+        Yields:
+            Generator[list] -- Cleaned records of a poll, sorted by the
+                replication key
+        """
+        stream: dict = STREAMS[tap_stream_id]
+        sort_key: Callable = records.sort_key(tap_stream_id)
+        since: int = timestamps.parse_timestamp(start_date)
 
         self.logger.info(
-            f'Retrieving app sales adjustment data from {start_date} to {end_date}',
+            f'Following {tap_stream_id} from '
+            f'{timestamps.format_timestamp(since)}',
         )
-         # The start date until now function wants a string
-        start_date_string = str(start_date)
-        first_start_date = start_date_string.replace(' ', 'T')
-        # Extra kwargs will be converted to parameters in the API requests
-        # start_date is parsed into batches, thus we remove it from the kwargs
-        kwargs.pop('start_date', None)
-
-        # Build URL
-        org_id: str=API_ORG_ID.replace(':organization_id:', self.organization_id)
-        url: str = (
-            f'{API_SCHEME}{API_BASE_URL}{org_id}'
-            f'{API_VERSION}{API_PATH_CALL_TYPE}'
-        )
-        self._create_headers()
 
-        # For starting with the bookmark value
-        first_run = True
-
-        for date_day in self._start_days_till_now(start_date_string):
-            hasNextPage = True
-            latest_cursor = ""
-            temp_list = []
-
-            # Data is paginated so need to go page by page until false
-            while hasNextPage:
-            
-                query: str = QUERIES['app_sale_adjustment']
-                # Replace dates in placeholders
-                if first_run:
-                    query = query.replace(':fromdate:', first_start_date)
-                else:
-                    query = query.replace(':fromdate:', date_day + "T00:00:00.000000Z")
-                
-                query = query.replace(':todate:', date_day + "T23:59:59.999999Z")
-                query = query.replace(':cursor:', latest_cursor)
-
-                response: httpx._models.Response = self.client.post(  # noqa
-                    url,
-                    headers=self.headers,
-                    data=query,
-                    )
-                time.sleep(2)
+        self._create_headers()
 
-                # Define cleaner:
-                cleaner: Callable = CLEANERS.get('shopify_partners_app_sale_adjustment')
+        while not stop.is_set():
+            poll_records: list = []
+            for edges in self._paginate(
+                stream['query'],
+                stream['connection'],
+                since,
+                self.now(),
+            ):
+                poll_records.extend(
+                    clean_page(tap_stream_id, edges, self.intern_table),
+                )
+            poll_records.sort(key=sort_key)
+
+            # Continue just after the last record
+            if poll_records:
+                since = timestamps.parse_timestamp(
+                    getattr(poll_records[-1], stream['replication_key']),
+                ) + 1
+
+            yield poll_records
+            stop.wait(poll_interval)
+
+    def demux(  # noqa: WPS210
+        self,
+        start_dates: dict,
+        end_date: Optional[str] = None,
+    ) -> Generator[tuple, None, None]:
+        """Yield the cleaned records of streams that share a connection.
+
+        The streams are fetched together, day by day, with one query for the
+        types of all streams. Every node is routed to its stream by its type,
+        or its __typename for transactions. The first window starts at the
+        earliest start date, the records before the start date of their own
+        stream are dropped. The records of a day are sorted per stream, on
+        disk when a stream has more records than the sort buffer.
 
-                # Raise error on 4xx and 5xxx
-                response.raise_for_status()
+        Arguments:
+            start_dates {dict} -- Start date per stream id, all streams have
+                the same demux query
 
-                # Create dictionary from response
-                response_data: dict = response.json()
-                hasNextPage = response_data['data']['transactions']['pageInfo'].get('hasNextPage')
-                for transaction in response_data['data']['transactions']['edges']:
-                    latest_cursor = transaction.get('cursor')
-                    temp_transaction = self.flatten(transaction)
-                    temp_list.append([temp_transaction])
+        Keyword Arguments:
+            end_date {Optional[str]} -- End of the last window
+                (default: {None}, now)
 
-            temp_list_sort = sorted(temp_list, key=lambda d: d[0]['node.createdAt'])
+        Yields:
+            Generator[tuple] -- Stream id and cleaned record of the stream's
+                record type
+        """
+        tap_stream_ids: list = list(start_dates)
+        stream: dict = STREAMS[tap_stream_ids[0]]
+
+        # Route the types and typenames of the nodes to their stream
+        routes: dict = {}
+        for tap_stream_id in tap_stream_ids:
+            routes.update(dict.fromkeys(
+                STREAMS[tap_stream_id]['types'],
+                tap_stream_id,
+            ))
+            if STREAMS[tap_stream_id].get('typename'):
+                routes[STREAMS[tap_stream_id]['typename']] = tap_stream_id
+        types: list = [
+            stream_type
+            for tap_stream_id in tap_stream_ids
+            for stream_type in STREAMS[tap_stream_id]['types']
+        ]
+
+        starts: dict = {
+            tap_stream_id: timestamps.parse_timestamp(start_date)
+            for tap_stream_id, start_date in start_dates.items()
+        }
+        end: int = (
+            timestamps.parse_timestamp(end_date) if end_date else self.now()
+        )
 
-            for i in temp_list_sort:
-                yield cleaner(date_day, i[0])
+        self.logger.info(
+            f'Retrieving {", ".join(tap_stream_ids)} data together from '
+            f'{timestamps.format_timestamp(min(starts.values()))} to '
+            f'{timestamps.format_timestamp(end)}',
+        )
 
-            first_run = False
+        self._create_headers()
 
-        self.logger.info('Finished: shopify_partners_app_sale_adjustment')
-    
-    def shopify_partners_app_relationship(  # noqa: WPS210, WPS213
+        for date_day, from_date, to_date in timestamps.day_windows(
+            min(starts.values()),
+            end,
+        ):
+            day_sorts: dict = {
+                tap_stream_id: ExternalSort(
+                    records.sort_key(tap_stream_id),
+                    self.sort_buffer_size,
+                    records.RECORD_TYPES[tap_stream_id],
+                )
+                for tap_stream_id in tap_stream_ids
+            }
+            for edges in prefetch(
+                self._paginate(
+                    stream['demux'],
+                    stream['connection'],
+                    from_date,
+                    to_date,
+                    types,
+                ),
+                self.prefetch_pages,
+            ):
+                # Route the edges of the page to their stream
+                stream_edges: dict = {
+                    tap_stream_id: [] for tap_stream_id in tap_stream_ids
+                }
+                for edge in edges:
+                    node: dict = edge['node']
+                    stream_edges[
+                        routes[node.get('type') or node.get('__typename')]
+                    ].append(edge)
+
+                for tap_stream_id, page_edges in stream_edges.items():
+                    replication_key: str = (
+                        STREAMS[tap_stream_id]['replication_key']
+                    )
+                    day_sorts[tap_stream_id].extend(
+                        record
+                        for record in clean_page(
+                            tap_stream_id,
+                            page_edges,
+                            self.intern_table,
+                        )
+                        if timestamps.parse_timestamp(
+                            getattr(record, replication_key),
+                        ) >= starts[tap_stream_id]
+                    )
+                self._reduce_memory(
+                    ', '.join(tap_stream_ids),
+                    *day_sorts.values(),
+                )
+
+            for tap_stream_id, day_sort in day_sorts.items():
+                self.logger.info(
+                    f'Buffered {len(day_sort)} records of {tap_stream_id} '
+                    f'of {date_day}, {len(day_sort.runs)} runs spilled to disk',
+                )
+                for record in day_sort.sorted():
+                    yield tap_stream_id, record
+
+        self.logger.info(f'Finished: {", ".join(tap_stream_ids)}')
+
+    def _stream_days(  # noqa: WPS210
         self,
+        tap_stream_id: str,
         **kwargs: dict,
-    ) -> Generator[dict, None, None]:
-        """Shopify Partners app relationship data (installs/uninstalls)
+    ) -> Generator[tuple, None, None]:
+        """Yield the cleaned records of a stream, day by day.
+
+        The first day window starts at the bookmark, every next window starts
+        at midnight. The records of a day are sorted by the replication key.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+
+        Keyword Arguments:
+            start_date {str} -- Start of the first window
+            end_date {str} -- End of the last window (default: now)
 
         Raises:
             ValueError: When the parameter start_date is missing
 
         Yields:
-            Generator[dict] -- Yields Shopify Partners app relationship data
+            Generator[tuple] -- Cleaned records of the stream's record type
         """
-        self.logger.info('Stream Shopify Partners App Relationships')
-
-        # Validate the start_date value exists
-        start_date_input: str = str(kwargs.get('start_date', ''))
-
-        if not start_date_input:
-            raise ValueError('The parameter start_date is required.')
-
-        # Set start date and end date
-        start_date: datetime = isoparse(start_date_input)
-        end_date: datetime = datetime.now(timezone.utc).replace(microsecond=0)
+        stream: dict = STREAMS[tap_stream_id]
+        sort_key: Callable = records.sort_key(tap_stream_id)
+
+        for date_day, from_date, to_date in self._windows(
+            tap_stream_id,
+            **kwargs,
+        ):
+            rss_before: int = memory.rss()
+
+            # Clean every page as a whole, then sort the day, on disk when
+            # it has more records than the sort buffer
+            day_sort: ExternalSort = ExternalSort(
+                sort_key,
+                self.sort_buffer_size,
+                records.RECORD_TYPES[tap_stream_id],
+            )
+            for edges in prefetch(
+                self._paginate(
+                    stream['query'],
+                    stream['connection'],
+                    from_date,
+                    to_date,
+                ),
+                self.prefetch_pages,
+            ):
+                day_sort.extend(
+                    clean_page(tap_stream_id, edges, self.intern_table),
+                )
+                self._reduce_memory(tap_stream_id, day_sort)
+
+            self.logger.info(
+                f'Buffered {len(day_sort)} records of {date_day}, '
+                f'{len(day_sort.runs)} runs spilled to disk, RSS '
+                f'{memory.format_size(rss_before)} before and '
+                f'{memory.format_size(memory.rss())} after, '
+                f'{len(self.intern_table)} interned values',
+            )
+
+            yield from day_sort.sorted()
+
+        self.logger.info(f'Finished: {tap_stream_id}')
+
+    def raw_days(
+        self,
+        tap_stream_id: str,
+        max_edges: int = 0,
+        **kwargs: dict,
+    ) -> Generator[tuple, None, None]:
+        """Yield the raw edges of a stream, day by day.
 
-        self.logger.info(
-            f'Retrieving app relationship data from {start_date} to {end_date}',
-        )
-         # The start date until now function wants a string
-        start_date_string = str(start_date)
-        first_start_date = start_date_string.replace(' ', 'T')
-        # Extra kwargs will be converted to parameters in the API requests
-        # start_date is parsed into batches, thus we remove it from the kwargs
-        kwargs.pop('start_date', None)
-
-        # Build URL
-        org_id: str=API_ORG_ID.replace(':organization_id:', self.organization_id)
-        url: str = (
-            f'{API_SCHEME}{API_BASE_URL}{org_id}'
-            f'{API_VERSION}{API_PATH_CALL_TYPE}'
-        )
-        self._create_headers()
+        The days are the same as those of the stream method, the edges are
+        left to be cleaned by the caller, e.g. in another process. A day is
+        yielded in parts once it has max_edges edges, so a part holds at most
+        a page more than max_edges edges.
 
-        # For starting with the bookmark value
-        first_run = True
-
-        for date_day in self._start_days_till_now(start_date_string):
-            hasNextPage = True
-            latest_cursor = ""
-            temp_list = []
-            
-            # Data is paginated so need to go page by page until false
-            while hasNextPage:
-                query: str = QUERIES['app_relationship']
-                # Replace dates in placeholders
-                if first_run:
-                    query = query.replace(':fromdate:', first_start_date)
-                else:
-                    query = query.replace(':fromdate:', date_day + "T00:00:00.000000Z")
-                
-                query = query.replace(':todate:', date_day + "T23:59:59.999999Z")
-                query = query.replace(':cursor:', latest_cursor)
-                
-                response: httpx._models.Response = self.client.post(  # noqa
-                    url,
-                    headers=self.headers,
-                    data=query,
-                    )
-                time.sleep(2)
+        Arguments:
+            tap_stream_id {str} -- Stream id
 
-                # Define cleaner:
-                cleaner: Callable = CLEANERS.get('shopify_partners_app_relationship')
+        Keyword Arguments:
+            max_edges {int} -- Maximum edges per part of a day, 0 yields
+                every day at once (default: {0})
+            start_date {str} -- Start of the first window
+            end_date {str} -- End of the last window (default: now)
 
-                # Raise error on 4xx and 5xxx
-                response.raise_for_status()
+        Raises:
+            ValueError: When the parameter start_date is missing
 
-                # Create dictionary from response
-                response_data: dict = response.json()
-                hasNextPage = response_data['data']['app']['events']['pageInfo'].get('hasNextPage')
-                for transaction in response_data['data']['app']['events']['edges']:
-                    latest_cursor = transaction.get('cursor')
-                    temp_transaction = self.flatten(transaction)
-                    temp_list.append([temp_transaction])
+        Yields:
+            Generator[tuple] -- Day and the edges of its pages
+        """
+        stream: dict = STREAMS[tap_stream_id]
+
+        for date_day, from_date, to_date in self._windows(
+            tap_stream_id,
+            **kwargs,
+        ):
+            day_edges: list = []
+            parts: int = 0
+            for edges in prefetch(
+                self._paginate(
+                    stream['query'],
+                    stream['connection'],
+                    from_date,
+                    to_date,
+                ),
+                self.prefetch_pages,
+            ):
+                day_edges.extend(edges)
+                if max_edges and len(day_edges) >= max_edges:
+                    yield date_day, day_edges
+                    day_edges = []
+                    parts += 1
+            if day_edges or not parts:
+                yield date_day, day_edges
+
+        self.logger.info(f'Finished: {tap_stream_id}')
+
+    def _reduce_memory(
+        self,
+        tap_stream_id: str,
+        *day_sorts: ExternalSort,
+    ) -> None:
+        """Shrink the pages and the day buffers when nearing the memory budget.
 
-            temp_list_sort = sorted(temp_list, key=lambda d: d[0]['node.occurredAt'])
+        Arguments:
+            tap_stream_id {str} -- Stream id
+            day_sorts {ExternalSort} -- Sorts of the day, that spill their
+                records to disk from then on
+        """
+        if self.memory_budget is None:
+            return
+        if not self.memory_budget.under_pressure(tap_stream_id, 'pages'):
+            return
+
+        self.page_sizer.shrink()
+        if day_sorts:
+            self.sort_buffer_size = min(
+                day_sort.shrink() for day_sort in day_sorts
+            )
+            self.logger.info(
+                f'Sorting at most {self.sort_buffer_size} records of a day '
+                f'in memory',
+            )
+
+    def _windows(
+        self,
+        tap_stream_id: str,
+        **kwargs: dict,
+    ) -> Iterable[tuple]:
+        """Return the day windows to query of a stream.
 
-            for i in temp_list_sort:
-                yield cleaner(date_day, i[0])
+        The first day window starts at the bookmark, every next window starts
+        at midnight. The empty days of sparse streams are skipped.
 
-            first_run = False
+        Arguments:
+            tap_stream_id {str} -- Stream id
 
-        self.logger.info('Finished: shopify_partners_app_relationship')
-    
-    def shopify_partners_app_subscription_charge(  # noqa: WPS210, WPS213
-        self,
-        **kwargs: dict,
-    ) -> Generator[dict, None, None]:
-        """Shopify Partners app subscription charge data
+        Keyword Arguments:
+            start_date {str} -- Start of the first window
+            end_date {str} -- End of the last window (default: now)
 
         Raises:
             ValueError: When the parameter start_date is missing
 
-        Yields:
-            Generator[dict] -- Yields Shopify Partners app subscription charge data
+        Returns:
+            Iterable[tuple] -- Day, window start and window end
         """
-        self.logger.info('Stream Shopify Partners App Subscription Charges')
-
         # Validate the start_date value exists
         start_date_input: str = str(kwargs.get('start_date', ''))
 
         if not start_date_input:
             raise ValueError('The parameter start_date is required.')
 
-        # Set start date and end date
-        start_date: datetime = isoparse(start_date_input)
-        end_date: datetime = datetime.now(timezone.utc).replace(microsecond=0)
+        # Set start date and end date, the end date is now unless given
+        start_date: int = timestamps.parse_timestamp(start_date_input)
+        end_date: int = (
+            timestamps.parse_timestamp(str(kwargs['end_date']))
+            if kwargs.get('end_date') else self.now()
+        )
 
         self.logger.info(
-            f'Retrieving app subscription charge data from {start_date} to {end_date}',
-        )
-         # The start date until now function wants a string
-        start_date_string = str(start_date)
-        first_start_date = start_date_string.replace(' ', 'T')
-        # Extra kwargs will be converted to parameters in the API requests
-        # start_date is parsed into batches, thus we remove it from the kwargs
-        kwargs.pop('start_date', None)
-
-        # Build URL
-        org_id: str=API_ORG_ID.replace(':organization_id:', self.organization_id)
-        url: str = (
-            f'{API_SCHEME}{API_BASE_URL}{org_id}'
-            f'{API_VERSION}{API_PATH_CALL_TYPE}'
+            f'Retrieving {tap_stream_id} data from '
+            f'{timestamps.format_timestamp(start_date)} to '
+            f'{timestamps.format_timestamp(end_date)}',
         )
+
         self._create_headers()
 
-        # For starting with the bookmark value
-        first_run = True
-
-        for date_day in self._start_days_till_now(start_date_string):
-            hasNextPage = True
-            latest_cursor = ""
-            temp_list = []
-
-            # Data is paginated so need to go page by page until false
-            while hasNextPage:
-                query: str = QUERIES['app_subscription_charge']
-                # Replace dates in placeholders
-                if first_run:
-                    query = query.replace(':fromdate:', first_start_date)
-                else:
-                    query = query.replace(':fromdate:', date_day + "T00:00:00.000000Z")
-                
-                query = query.replace(':todate:', date_day + "T23:59:59.999999Z")
-                query = query.replace(':cursor:', latest_cursor)
-
-                response: httpx._models.Response = self.client.post(  # noqa
-                    url,
-                    headers=self.headers,
-                    data=query,
-                    )
-                time.sleep(2)
+        # Only query the days with data of sparse streams
+        windows: Iterable[tuple] = timestamps.day_windows(start_date, end_date)
+        if tap_stream_id in self.sparse_streams:
+            windows = self._populated_windows(tap_stream_id, list(windows))
+        return windows
+
+    def _paginate(
+        self,
+        query_name: str,
+        connection: tuple,
+        from_date: int,
+        to_date: int,
+        types: Iterable[str] = (),
+    ) -> Generator[list, None, None]:
+        """Yield the edges of a connection in the window, page by page.
+
+        The page size of every request is chosen by the page sizer, from the
+        duration of the previous requests. A throttled request is retried
+        with a smaller page.
+
+        Arguments:
+            query_name {str} -- Name of the query in QUERIES
+            connection {tuple} -- Path to the connection in the response data
+            from_date {int} -- Window start in epoch microseconds
+            to_date {int} -- Window end in epoch microseconds
+
+        Keyword Arguments:
+            types {Iterable[str]} -- Types of the :types: placeholder
+                (default: {()})
+
+        Yields:
+            Generator[list] -- Edges of a page
+        """
+        # Replace types and dates in placeholders
+        query_window: str = QUERIES[query_name].replace(
+            ':types:',
+            ', '.join(types),
+        ).replace(
+            ':fromdate:',
+            timestamps.format_timestamp(from_date),
+        ).replace(
+            ':todate:',
+            timestamps.format_timestamp(to_date),
+        )
+
+        has_next_page: bool = True
+        latest_cursor: str = ''
+        throttled: int = 0
+
+        # Data is paginated so need to go page by page until false
+        while has_next_page:
+            page_size: int = self.page_sizer.size(query_name)
+            query: str = query_window.replace(
+                ':cursor:',
+                latest_cursor,
+            ).replace(
+                ':first:',
+                str(page_size),
+            )
+
+            self.rate_limiter.wait()
+            request_start: float = time.monotonic()
+            response: httpx._models.Response = self.client.post(  # noqa
+                self._url(),
+                headers=self.headers,
+                data=query,
+            )
+            request_seconds: float = time.monotonic() - request_start
+
+            # Retry a throttled request with a smaller page
+            if response.status_code == HTTP_TOO_MANY_REQUESTS:
+                throttled += 1
+                if throttled <= THROTTLED_RETRIES:
+                    self.page_sizer.throttled(query_name)
+                    time.sleep(float(response.headers.get('Retry-After', 1)))
+                    continue
+            throttled = 0
+
+            # Raise error on 4xx and 5xxx
+            response.raise_for_status()
+
+            # Walk to the connection in the response
+            response_json: dict = response.json()
+            response_data: dict = response_json['data']
+            for key in connection:
+                response_data = response_data[key]
+
+            has_next_page = response_data['pageInfo'].get('hasNextPage')
+            edges: list = response_data['edges']
+            if edges:
+                latest_cursor = edges[-1].get('cursor')
+            self.page_sizer.observe(
+                query_name,
+                request_seconds,
+                len(edges),
+                page_size,
+                response_bytes=len(response.content),
+                query_cost=_query_cost(response_json),
+            )
+            yield edges
+
+    def _populated_windows(
+        self,
+        tap_stream_id: str,
+        windows: list,
+    ) -> Generator[tuple, None, None]:
+        """Yield the day windows with data, in order.
+
+        The whole range of the windows is probed for a single record. An
+        empty range is skipped, otherwise both halves are probed, down to
+        single days. A range of mostly empty days costs a few probes instead
+        of a query per day, but a range of mostly populated days costs up to
+        a probe per day more, so only streams configured as sparse are
+        probed.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+            windows {list} -- Day windows
 
-                # Define cleaner:
-                cleaner: Callable = CLEANERS.get('shopify_partners_app_subscription_charge')
+        Yields:
+            Generator[tuple] -- Day windows with data
+        """
+        if not windows:
+            return
+
+        if not self.streams_with_data(
+            {tap_stream_id: (windows[0][1], windows[-1][2])},
+        ):
+            self.logger.info(
+                f'Skipping {len(windows)} empty days of {tap_stream_id} from '
+                f'{windows[0][0]} to {windows[-1][0]}',
+            )
+            return
+
+        if len(windows) == 1:
+            yield windows[0]
+            return
+
+        middle: int = len(windows) // 2
+        yield from self._populated_windows(tap_stream_id, windows[:middle])
+        yield from self._populated_windows(tap_stream_id, windows[middle:])
 
-                # Raise error on 4xx and 5xxx
-                response.raise_for_status()
+    def streams_with_data(self, windows: dict) -> set:
+        """Return the streams that have any data in their window.
 
-                # Create dictionary from response
-                response_data: dict = response.json()
-                hasNextPage = response_data['data']['app']['events']['pageInfo'].get('hasNextPage')
-                for transaction in response_data['data']['app']['events']['edges']:
-                    latest_cursor = transaction.get('cursor')
-                    temp_transaction = self.flatten(transaction)
-                    temp_list.append([temp_transaction])
+        All streams are probed for a single record in one request, every
+        stream as an aliased field of the query.
 
-            temp_list_sort = sorted(temp_list, key=lambda d: d[0]['node.occurredAt'])
+        Arguments:
+            windows {dict} -- Window start and end in epoch microseconds per
+                stream id
 
-            for i in temp_list_sort:
-                yield cleaner(date_day, i[0])
+        Returns:
+            set -- Stream ids with at least one record in their window
+        """
+        if not windows:
+            return set()
+
+        aliases: dict = {
+            f'probe{index}': tap_stream_id
+            for index, tap_stream_id in enumerate(windows)
+        }
+
+        # Build the query with a probe field per stream
+        fields: list = []
+        for alias, tap_stream_id in aliases.items():
+            stream: dict = STREAMS[tap_stream_id]
+            from_date, to_date = windows[tap_stream_id]
+            fields.append(
+                QUERIES[stream['probe']].replace(
+                    ':alias:',
+                    alias,
+                ).replace(
+                    ':types:',
+                    ', '.join(stream['types']),
+                ).replace(
+                    ':fromdate:',
+                    timestamps.format_timestamp(from_date),
+                ).replace(
+                    ':todate:',
+                    timestamps.format_timestamp(to_date),
+                ),
+            )
+        query: str = '{' + ''.join(fields) + '}'
 
-            first_run = False
+        self._create_headers()
+        self.rate_limiter.wait()
+        response: httpx._models.Response = self.client.post(  # noqa
+            self._url(),
+            headers=self.headers,
+            data=query,
+        )
 
-        self.logger.info('Finished: shopify_partners_app_subscription_charge')
+        # Raise error on 4xx and 5xxx
+        response.raise_for_status()
+
+        # Walk from every alias to the connection of its stream
+        response_data: dict = response.json()['data']
+        with_data: set = set()
+        for alias, tap_stream_id in aliases.items():
+            connection: dict = response_data[alias]
+            for key in STREAMS[tap_stream_id]['connection'][1:]:
+                connection = connection[key]
+            if connection['edges']:
+                with_data.add(tap_stream_id)
+        return with_data
+
+    def now(self) -> int:
+        """Return the current time, that of the recording when replaying.
+
+        Returns:
+            int -- Epoch microseconds
+        """
+        client_now: Optional[Callable] = getattr(self.client, 'now', None)
+        if client_now is None:
+            return timestamps.now()
+        return client_now()
 
     def _create_headers(self) -> None:
         """Create authenticationn headers for requests."""
@@ -449,34 +845,17 @@ class Shopify(object):  # noqa: WPS230
         )
         self.headers = headers
 
-    def _start_days_till_now(self, start_date: str) -> Generator:
-        """Yield YYYY/MM/DD for every day until now.
+    def _url(self) -> str:
+        """Build the GraphQL endpoint URL of the organization.
 
-        Arguments:
-            start_date {str} -- Start date e.g. 2020-01-01
-
-        Yields:
-            Generator -- Every day until now.
+        Returns:
+            str -- URL
         """
-        # Parse input date
-        year: int = int(start_date.split('-')[0])
-        month: int = int(start_date.split('-')[1].lstrip())
-        # day: int = int(start_date.split('-')[2].lstrip())
-        # strip the ISO-8601 characters off of the day, leaving only the digit
-        # day: int = int(start_date.split('-')[2].rstrip("0:+ ").lstrip("0"))
-        day: int = int(start_date.split('-')[2].lstrip("0")[:2].rstrip())
-
-        # Setup start period
-        period: date = date(year, month, day)
-
-        # Setup itterator
-        dates: rrule = rrule(
-            freq=DAILY,
-            dtstart=period,
-            until=datetime.utcnow(),
+        org_id: str = API_ORG_ID.replace(
+            ':organization_id:',
+            self.organization_id,
+        )
+        return (
+            f'{API_SCHEME}{API_BASE_URL}{org_id}'
+            f'{API_VERSION}{API_PATH_CALL_TYPE}'
         )
-
-        # Yield dates in YYYY-MM-DD format
-        yield from (date_day.strftime('%Y-%m-%d') for date_day in dates)
-
-
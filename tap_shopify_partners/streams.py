@@ -1,10 +1,15 @@
 """Streams metadata."""
 # -*- coding: utf-8 -*-
+import re
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 from types import MappingProxyType
 
 from dateutil.parser import parse as parse_date
 
+from tap_shopify_partners import timestamps
+
 # Helper constants for timezone parsing
 HOUR: int = 3600
 TIMEZONES: MappingProxyType = MappingProxyType({
@@ -251,6 +256,84 @@ def date_parser(input_date: str) -> str:
     return parsed_date.isoformat()
 
 
+# Strict ISO-8601 timestamps and dates as returned by the API
+ISO_TIMESTAMP: re.Pattern = re.compile(
+    r'[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}'
+    r'(\.[0-9]+)?(Z|[+-][0-9]{2}:?[0-9]{2})',
+)
+ISO_DATE: re.Pattern = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}')
+
+
+def timestamp_string(input_timestamp: str) -> str:
+    """Help function to normalize a timestamp to UTC.
+
+    Strict ISO-8601 timestamps, as returned by the API, are parsed by slicing
+    the string. Anything else, e.g. with a timezone abbreviation, is parsed
+    by date_parser.
+
+    Arguments:
+        input_timestamp {str} -- Input timestamp as string
+
+    Returns:
+        {str} -- Timestamp as YYYY-MM-DDTHH:MM:SS.ffffffZ, like the bookmarks
+    """
+    if not ISO_TIMESTAMP.fullmatch(input_timestamp):
+        input_timestamp = date_parser(input_timestamp)
+    return timestamps.format_timestamp(
+        timestamps.parse_timestamp(input_timestamp),
+    )
+
+
+@lru_cache(maxsize=4096)
+def date_string(input_date: str) -> str:
+    """Help function to normalize a date.
+
+    Dates repeat a lot, e.g. billing dates, so the results are memoized.
+
+    Arguments:
+        input_date {str} -- Input date as string
+
+    Returns:
+        {str} -- Date as YYYY-MM-DD
+    """
+    if ISO_DATE.fullmatch(input_date):
+        return input_date
+    return timestamps.format_day(
+        timestamps.parse_timestamp(timestamp_string(input_date)),
+    )
+
+
+# Plain decimal notation as returned by the API for money amounts
+DECIMAL_STRING: re.Pattern = re.compile(r'-?[0-9]+(\.[0-9]+)?')
+
+
+def decimal_string(input_amount: str) -> str:
+    """Help function to validate a money amount as exact decimal string.
+
+    Amounts in plain decimal notation, e.g. 9.99, are returned as is. Other
+    notations, e.g. 1E+1, are normalized to plain decimal notation.
+
+    Arguments:
+        input_amount {str} -- Input amount as string
+
+    Raises:
+        ValueError: When the amount is not a finite decimal
+
+    Returns:
+        {str} -- Amount in plain decimal notation
+    """
+    if DECIMAL_STRING.fullmatch(input_amount):
+        return input_amount
+
+    try:
+        amount: Decimal = Decimal(input_amount)
+    except InvalidOperation:
+        raise ValueError(f'Invalid decimal amount: {input_amount}')
+    if not amount.is_finite():
+        raise ValueError(f'Invalid decimal amount: {input_amount}')
+    return format(amount, 'f')
+
+
 # Streams metadata
 STREAMS: MappingProxyType = MappingProxyType({
     'shopify_partners_app_subscription_sale': {
@@ -258,51 +341,73 @@ STREAMS: MappingProxyType = MappingProxyType({
         'replication_method': 'INCREMENTAL',
         'replication_key': 'created_at',
         'bookmark': 'start_date',
+        'query': 'app_subscription_sale',
+        'connection': ('transactions',),
+        'probe': 'transactions_probe',
+        'demux': 'transactions_demux',
+        'types': ('APP_SUBSCRIPTION_SALE',),
+        'typename': 'AppSubscriptionSale',
+        'dedup_key': ('id', 'created_at'),
         'mapping': {
             'id': {
                 'map': 'id', 'null': False,
+                'path': ('node', 'id'),
             },
             'createdAt': {
                 'map': 'created_at', 'null': False,
+                'path': ('node', 'createdAt'), 'type': timestamp_string,
             },
             'netAmount': {
                 'map': 'net_amount', 'null': False,
+                'path': ('node', 'netAmount', 'amount'), 'type': decimal_string,
             },
             'netAmountCurrencyCode': {
                 'map': 'net_amount_currency_code', 'null': False,
+                'path': ('node', 'netAmount', 'currencyCode'), 'intern': True,
             },
             'grossAmount': {
                 'map': 'gross_amount', 'null': False,
+                'path': ('node', 'grossAmount', 'amount'), 'type': decimal_string,
             },
              'grossAmountCurrencyCode': {
                 'map': 'gross_amount_currency_code', 'null': False,
+                'path': ('node', 'grossAmount', 'currencyCode'), 'intern': True,
             },
             'shopifyFee': {
                 'map': 'shopify_fee', 'null': False,
+                'path': ('node', 'shopifyFee', 'amount'), 'type': decimal_string,
             },
             'shopifyFeeCurrencyCode': {
                 'map': 'shopify_fee_currency_code', 'null': False,
+                'path': ('node', 'shopifyFee', 'currencyCode'), 'intern': True,
             },
             'app': {
                 'map': 'app', 'null': False,
+                'path': ('node', 'app', 'name'), 'intern': True,
             },
             'appId': {
                 'map': 'app_id', 'null': False,
+                'path': ('node', 'app', 'id'), 'intern': True,
             },
             'shopDomain': {
                 'map': 'shop_domain', 'null': False,
+                'path': ('node', 'shop', 'myshopifyDomain'), 'intern': True,
             },
             'shopName': {
                 'map': 'shop_name', 'null': False,
+                'path': ('node', 'shop', 'name'), 'intern': True,
             },
             'shopId': {
                 'map': 'shop_id', 'null': False,
+                'path': ('node', 'shop', 'id'), 'intern': True,
             },
             'billingInterval': {
                 'map': 'billing_interval', 'null': True,
+                'path': ('node', 'billingInterval'),
             }, 
             'chargeId': {
                 'map': 'charge_id', 'null': True,
+                'path': ('node', 'chargeId'),
             },  
         }
     },
@@ -311,48 +416,69 @@ STREAMS: MappingProxyType = MappingProxyType({
         'replication_method': 'INCREMENTAL',
         'replication_key': 'created_at',
         'bookmark': 'start_date',
+        'query': 'app_sale_adjustment',
+        'connection': ('transactions',),
+        'probe': 'transactions_probe',
+        'demux': 'transactions_demux',
+        'types': ('APP_SALE_ADJUSTMENT',),
+        'typename': 'AppSaleAdjustment',
+        'dedup_key': ('id', 'created_at'),
         'mapping': {
             'app': {
                 'map': 'app', 'null': False,
+                'path': ('node', 'app', 'name'), 'intern': True,
             },
             'appId': {
                 'map': 'app_id', 'null': False,
+                'path': ('node', 'app', 'id'), 'intern': True,
             },
             'chargeId': {
                 'map': 'charge_id', 'null': True,
+                'path': ('node', 'chargeId'),
             },
             'createdAt': {
                 'map': 'created_at', 'null': False,
+                'path': ('node', 'createdAt'), 'type': timestamp_string,
             },
             'grossAmount': {
                 'map': 'gross_amount', 'null': False,
+                'path': ('node', 'grossAmount', 'amount'), 'type': decimal_string,
             },
             'grossAmountCurrencyCode': {
                 'map': 'gross_amount_currency_code', 'null': False,
+                'path': ('node', 'grossAmount', 'currencyCode'), 'intern': True,
             },
             'id': {
                 'map': 'id', 'null': False,
+                'path': ('node', 'id'),
             },
             'netAmount': {
                 'map': 'net_amount', 'null': False,
+                'path': ('node', 'netAmount', 'amount'), 'type': decimal_string,
             },
             'netAmountCurrencyCode': {
                 'map': 'net_amount_currency_code', 'null': False,
+                'path': ('node', 'netAmount', 'currencyCode'), 'intern': True,
             },
             'shopDomain': {
                 'map': 'shop_domain', 'null': False,
+                'path': ('node', 'shop', 'myshopifyDomain'), 'intern': True,
             },
             'shopName': {
                 'map': 'shop_name', 'null': False,
+                'path': ('node', 'shop', 'name'), 'intern': True,
             },
             'shopId': {
                 'map': 'shop_id', 'null': False,
+                'path': ('node', 'shop', 'id'), 'intern': True,
             },
             'shopifyFee': {
                 'map': 'shopify_fee', 'null': False,
+                'path': ('node', 'shopifyFee', 'amount'), 'type': decimal_string,
             },
             'shopifyFeeCurrencyCode': {
                 'map': 'shopify_fee_currency_code', 'null': False,
+                'path': ('node', 'shopifyFee', 'currencyCode'), 'intern': True,
             },
         }
     },
@@ -361,33 +487,53 @@ STREAMS: MappingProxyType = MappingProxyType({
         'replication_method': 'INCREMENTAL',
         'replication_key': 'occurred_at',
         'bookmark': 'start_date',
+        'query': 'app_relationship',
+        'connection': ('app', 'events'),
+        'probe': 'app_events_probe',
+        'demux': 'app_events_demux',
+        'types': (
+            'RELATIONSHIP_DEACTIVATED',
+            'RELATIONSHIP_INSTALLED',
+            'RELATIONSHIP_REACTIVATED',
+            'RELATIONSHIP_UNINSTALLED',
+        ),
+        'dedup_key': ('shop_id', 'type', 'occurred_at'),
         'mapping': {
             'app': {
                 'map': 'app', 'null': False,
+                'path': ('node', 'app', 'name'), 'intern': True,
             },
             'appId': {
                 'map': 'app_id', 'null': False,
+                'path': ('node', 'app', 'id'), 'intern': True,
             },
             'occurredAt': {
                 'map': 'occurred_at', 'null': False,
+                'path': ('node', 'occurredAt'), 'type': timestamp_string,
             },
             'shopDomain': {
                 'map': 'shop_domain', 'null': False,
+                'path': ('node', 'shop', 'myshopifyDomain'), 'intern': True,
             },
             'shopName': {
                 'map': 'shop_name', 'null': False,
+                'path': ('node', 'shop', 'name'), 'intern': True,
             },
             'shopId': {
                 'map': 'shop_id', 'null': False,
+                'path': ('node', 'shop', 'id'), 'intern': True,
             },
             'type': {
                 'map': 'type', 'null': False,
+                'path': ('node', 'type'),
             },
             'description': {
                 'map': 'description', 'null': True,
+                'path': ('node', 'description'),
             },
             'reason': {
                 'map': 'reason', 'null': True,
+                'path': ('node', 'reason'),
             },
         }
     },
@@ -396,46 +542,88 @@ STREAMS: MappingProxyType = MappingProxyType({
         'replication_method': 'INCREMENTAL',
         'replication_key': 'occurred_at',
         'bookmark': 'start_date',
+        'query': 'app_subscription_charge',
+        'connection': ('app', 'events'),
+        'probe': 'app_events_probe',
+        'demux': 'app_events_demux',
+        'types': (
+            'SUBSCRIPTION_CHARGE_ACCEPTED',
+            'SUBSCRIPTION_CHARGE_ACTIVATED',
+            'SUBSCRIPTION_CHARGE_CANCELED',
+            'SUBSCRIPTION_CHARGE_DECLINED',
+            'SUBSCRIPTION_CHARGE_EXPIRED',
+            'SUBSCRIPTION_CHARGE_FROZEN',
+            'SUBSCRIPTION_CHARGE_UNFROZEN',
+        ),
+        'dedup_key': ('id', 'type', 'occurred_at'),
         'mapping': {
             'app': {
                 'map': 'app', 'null': False,
+                'path': ('node', 'app', 'name'), 'intern': True,
             },
             'appId': {
                 'map': 'app_id', 'null': False,
+                'path': ('node', 'app', 'id'), 'intern': True,
             },
             'subscriptionCharge': {
                 'map': 'subscription_charge', 'null': False,
+                'path': ('node', 'charge', 'amount', 'amount'), 'type': decimal_string,
             },
             'subscriptionChargeCurrencyCode': {
                 'map': 'subscription_charge_currency_code', 'null': False,
+                'path': ('node', 'charge', 'amount', 'currencyCode'), 'intern': True,
             },
             'billingOn': {
                 'map': 'billing_on', 'null': True,
+                'path': ('node', 'charge', 'billingOn'), 'type': date_string,
             },
             'id': {
                 'map': 'id', 'null': False,
+                'path': ('node', 'charge', 'id'),
             },
             'name': {
                 'map': 'name', 'null': False,
+                'path': ('node', 'charge', 'name'),
             },
             'test': {
                 'map': 'test', 'null': False,
+                'path': ('node', 'charge', 'test'),
             },
             'occurredAt': {
                 'map': 'occurred_at', 'null': False,
+                'path': ('node', 'occurredAt'), 'type': timestamp_string,
             },
             'shopDomain': {
                 'map': 'shop_domain', 'null': False,
+                'path': ('node', 'shop', 'myshopifyDomain'), 'intern': True,
             },
             'shopName': {
                 'map': 'shop_name', 'null': False,
+                'path': ('node', 'shop', 'name'), 'intern': True,
             },
             'shopId': {
                 'map': 'shop_id', 'null': False,
+                'path': ('node', 'shop', 'id'), 'intern': True,
             },
             'type': {
                 'map': 'type', 'null': False,
+                'path': ('node', 'type'),
             },
         }
     }
-})
\ No newline at end of file
+})
+
+
+# Streams computed by the tap from the records of other streams
+DERIVED_STREAMS: MappingProxyType = MappingProxyType({
+    'shopify_partners_daily_revenue': {
+        'key_properties': ['day', 'app_id', 'currency', 'type'],
+        'replication_method': 'INCREMENTAL',
+        'replication_key': 'day',
+        # Transaction type of the records of every source stream
+        'sources': MappingProxyType({
+            'shopify_partners_app_subscription_sale': 'APP_SUBSCRIPTION_SALE',
+            'shopify_partners_app_sale_adjustment': 'APP_SALE_ADJUSTMENT',
+        }),
+    },
+})
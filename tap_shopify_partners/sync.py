@@ -1,24 +1,53 @@
 """Sync data."""
 # -*- coding: utf-8 -*-
 import logging
+import multiprocessing
 from datetime import datetime, timezone
-from typing import Callable, Optional
+from functools import partial
+from operator import attrgetter
+from typing import Callable, Generator, Iterable, Optional
 
 import singer
 from singer.catalog import Catalog, CatalogEntry
 
-from tap_shopify_partners import tools
+from tap_shopify_partners import (
+    dedup,
+    memory,
+    mirror,
+    timestamps,
+    tools,
+    writers,
+)
+from tap_shopify_partners.pipeline import prefetch
+from tap_shopify_partners.rollup import DAILY_REVENUE, DailyRevenue
+from tap_shopify_partners.transform import (
+    DEFAULT_PART_SIZE,
+    sync_transformed,
+)
 from tap_shopify_partners.shopify_partners import Shopify
-from tap_shopify_partners.streams import STREAMS
+from tap_shopify_partners.streams import DERIVED_STREAMS, STREAMS
+from tap_shopify_partners.validation import (
+    DEFAULT_SAMPLE_INTERVAL,
+    RecordValidator,
+)
 
 LOGGER: logging.RootLogger = singer.get_logger()
 
+# Records per chunk in the queue between fetching and writing
+PIPELINE_CHUNK_SIZE: int = 100
 
-def sync(
+# Records written between two checks of the memory budget
+MEMORY_CHECK_RECORDS: int = 1000
+
+
+def sync(  # noqa: WPS210
     shopify_partners: Shopify,
     state: dict,
     catalog: Catalog,
     start_date: str,
+    config: Optional[dict] = None,
+    writer: Optional[writers.SingerWriter] = None,
+    stream_ids: Optional[Iterable[str]] = None,
 ) -> None:
     """Sync data from tap source.
 
@@ -27,15 +56,117 @@ def sync(
         state {dict} -- Tap state
         catalog {Catalog} -- Stream catalog
         start_date {str} -- Start date
+
+    Keyword Arguments:
+        config {Optional[dict]} -- Tap config (default: {None})
+        writer {Optional[SingerWriter]} -- Output writer that stays open
+            after the sync, a writer created from the config that is closed
+            after the sync when not given (default: {None})
+        stream_ids {Optional[Iterable[str]]} -- Streams to sync, all
+            selected streams when not given, the selected derived streams
+            are always synced (default: {None})
     """
+    config = config or {}
+    queue_size: int = int(config.get('pipeline_queue_size', 0))
+    close_writer: bool = writer is None
+    writer = writer or writers.create_writer(config)
+
     # For every stream in the catalog
     LOGGER.info('Sync')
     LOGGER.debug('Current state:\n{state}')
 
+    # In mirror read mode, the records are read from a local mirror instead
+    # of the API
+    local_mirror: Optional[mirror.Mirror] = None
+    if config.get('mirror_mode') == 'read':
+        local_mirror = mirror.Mirror(config['mirror_path'], read_only=True)
+
+    # Optionally drop records that were already emitted, e.g. by a re-run
+    dedup_index_size: int = int(config.get('dedup_index_size', 0))
+    dedup_indexes: dict = {}
+    if dedup_index_size:
+        dedup_indexes = dedup.load_indexes(
+            config.get('dedup_index_path'),
+            dedup_index_size,
+        )
+
     # Only selected streams are synced, whether a stream is selected is
     # determined by whether the key-value: "selected": true is in the schema
     # file.
-    for stream in catalog.get_selected_streams(state):
+    streams: list = list(catalog.get_selected_streams(state))
+    if stream_ids is not None:
+        stream_ids = set(stream_ids)
+        streams = [
+            stream
+            for stream in streams
+            if stream.tap_stream_id in stream_ids
+            or stream.tap_stream_id in DERIVED_STREAMS
+        ]
+
+    # The daily revenue is computed from the transaction streams
+    rollup: Optional[DailyRevenue] = None
+    if any(stream.tap_stream_id == DAILY_REVENUE for stream in streams):
+        rollup = DailyRevenue(state, writer, catalog.get_stream(DAILY_REVENUE))
+    streams = [stream for stream in streams if stream.tap_stream_id in STREAMS]
+
+    # Optionally validate the records against their schemas before writing
+    validator: Optional[RecordValidator] = None
+    if config.get('validate_records'):
+        validator = RecordValidator(
+            streams,
+            config['validate_records'],
+            int(config.get(
+                'validation_sample_interval',
+                DEFAULT_SAMPLE_INTERVAL,
+            )),
+        )
+
+    # Optionally clean and encode the records in worker processes, only
+    # when the records are written to stdout as they are. The workers get
+    # the raw edges of a whole day, so not when a day may not fit in memory
+    transform_workers: int = int(config.get('transform_workers', 0))
+    pool: Optional[multiprocessing.pool.Pool] = None
+    if (
+        transform_workers
+        and type(writer) is writers.SingerWriter  # noqa: WPS516
+        and local_mirror is None
+        and not dedup_index_size
+        and rollup is None
+        and validator is None
+        and not shopify_partners.sort_buffer_size
+        and shopify_partners.memory_budget is None
+    ):
+        pool = multiprocessing.Pool(transform_workers)
+
+    # Optionally skip the streams without new data, found with one probe
+    unchanged: set = set()
+    if config.get('skip_unchanged_streams') and local_mirror is None:
+        unchanged = unchanged_streams(shopify_partners, state, streams)
+
+    # Optionally fetch the streams that share a connection together
+    demux_groups: list = []
+    if config.get('demux_shared_roots') and local_mirror is None:
+        demux_groups = shared_root_groups(
+            [
+                stream
+                for stream in streams
+                if stream.tap_stream_id not in unchanged
+            ],
+            state,
+        )
+    demuxed: set = {
+        stream.tap_stream_id
+        for demux_group in demux_groups
+        for stream in demux_group
+    }
+
+    for stream in streams:
+        if stream.tap_stream_id in unchanged:
+            LOGGER.info(f'No new data, skipping stream: {stream.tap_stream_id}')
+            continue
+        if stream.tap_stream_id in demuxed:
+            continue
+
         LOGGER.info(f'Syncing stream: {stream.tap_stream_id}')
 
         # Update the current stream as active syncing in the state
@@ -50,7 +181,7 @@ def sync(
         LOGGER.debug(f'Stream state: {stream_state}')
         LOGGER.info(f'Stream state: {stream_state}')
         # Write the schema
-        singer.write_schema(
+        writer.write_schema(
             stream_name=stream.tap_stream_id,
             schema=stream.schema.to_dict(),
             key_properties=stream.key_properties,
@@ -59,43 +190,358 @@ def sync(
         # Every stream has a corresponding method in the Shopify object e.g.:
         # The stream: shopify_partners_app_subscription_sale will call: shopify_partners.shopify_partners_app_subscription_sale
         tap_data: Callable = getattr(shopify_partners, stream.tap_stream_id)
+        if local_mirror is not None:
+            tap_data = partial(local_mirror.read, stream.tap_stream_id)
+
+        # Optionally fetch and clean in a background thread while writing
+        tap_data = partial(_prefetched, tap_data, queue_size)
 
         # The tap_data method yields rows of data from the API
         # The state of the stream is used as kwargs for the method
         # E.g. if the state of the stream has a key 'start_date', it will be
         # used in the method as start_date='2021-01-01T00:00:00+0000'
-        for row in tap_data(**stream_state):
-            sync_record(stream, row, state)
+        if pool is not None:
+            sync_transformed(
+                shopify_partners,
+                stream,
+                stream_state,
+                state,
+                pool,
+                transform_workers,
+                int(config.get('transform_part_size', DEFAULT_PART_SIZE)),
+            )
+            continue
+
+        rows: Iterable[tuple] = _memory_checked(
+            tap_data(**stream_state),
+            shopify_partners.memory_budget,
+            writer,
+            stream.tap_stream_id,
+        )
+        if not dedup_index_size:
+            for row in rows:
+                sync_record(stream, row, state, writer, rollup, validator)
+            continue
+
+        is_new: Callable = new_record_filter(
+            stream.tap_stream_id,
+            dedup_indexes,
+            dedup_index_size,
+        )
+        for row in rows:
+            if is_new(row):
+                sync_record(stream, row, state, writer, rollup, validator)
+
+    # Fetch every group of streams that share a connection in one walk
+    for demux_group in demux_groups:
+        sync_demuxed(
+            shopify_partners,
+            demux_group,
+            state,
+            writer,
+            dedup_indexes,
+            dedup_index_size,
+            queue_size,
+            rollup,
+            validator,
+        )
+
+    for stream in streams:
+        if stream.tap_stream_id in dedup_indexes:
+            LOGGER.info(
+                f'Dropped {dedup_indexes[stream.tap_stream_id].dropped} '
+                f'duplicate records of stream: {stream.tap_stream_id}',
+            )
+
+    if validator is not None:
+        validator.report()
+    if shopify_partners.memory_budget is not None:
+        shopify_partners.memory_budget.report()
+
+    # Write the totals of the last day of the daily revenue
+    if rollup is not None:
+        rollup.close()
+
+    # Write the state, even when every stream was skipped
+    if unchanged or rollup is not None:
+        tools.clear_currently_syncing(state)
+        writer.write_state(state)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if close_writer:
+        writer.close()
+    dedup.save_indexes(config.get('dedup_index_path'), dedup_indexes)
+
+
+def shared_root_groups(streams: list, state: dict) -> list:
+    """Group the streams that share a connection.
+
+    Only streams with a start date in their state are grouped, and only
+    groups of more than one stream are returned.
+
+    Arguments:
+        streams {list} -- Selected streams
+        state {dict} -- Tap state
+
+    Returns:
+        list -- Lists of streams with the same demux query
+    """
+    groups: dict = {}
+    for stream in streams:
+        stream_state: dict = tools.get_stream_state(
+            state,
+            stream.tap_stream_id,
+        ) or {}
+        if STREAMS[stream.tap_stream_id]['bookmark'] in stream_state:
+            groups.setdefault(
+                STREAMS[stream.tap_stream_id]['demux'],
+                [],
+            ).append(stream)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def sync_demuxed(  # noqa: WPS211
+    shopify_partners: Shopify,
+    streams: list,
+    state: dict,
+    writer: writers.SingerWriter,
+    dedup_indexes: dict,
+    dedup_index_size: int,
+    queue_size: int = 0,
+    rollup: Optional[DailyRevenue] = None,
+    validator: Optional[RecordValidator] = None,
+) -> None:
+    """Sync streams that share a connection with one walk of the connection.
+
+    Every stream keeps its own bookmark.
+
+    Arguments:
+        shopify_partners {Shopify} -- Shopify Partners client
+        streams {list} -- Streams with the same demux query
+        state {dict} -- Tap state
+        writer {SingerWriter} -- Output writer
+        dedup_indexes {dict} -- Dedup index per stream id
+        dedup_index_size {int} -- Maximum keys per dedup index, 0 disables
+            deduplication
+
+    Keyword Arguments:
+        queue_size {int} -- Chunks of records to fetch ahead in a background
+            thread, 0 disables the background thread (default: {0})
+        rollup {Optional[DailyRevenue]} -- Daily revenue to add the
+            transactions to (default: {None})
+        validator {Optional[RecordValidator]} -- Validator of the records
+            (default: {None})
+    """
+    catalog_entries: dict = {
+        stream.tap_stream_id: stream for stream in streams
+    }
+    LOGGER.info(f'Syncing streams together: {", ".join(catalog_entries)}')
 
+    singer.set_currently_syncing(state, streams[0].tap_stream_id)
+    start_dates: dict = {}
+    is_new: dict = {}
+    for stream in streams:
+        writer.write_schema(
+            stream_name=stream.tap_stream_id,
+            schema=stream.schema.to_dict(),
+            key_properties=stream.key_properties,
+        )
+        start_dates[stream.tap_stream_id] = tools.get_stream_state(
+            state,
+            stream.tap_stream_id,
+        )[STREAMS[stream.tap_stream_id]['bookmark']]
+        is_new[stream.tap_stream_id] = new_record_filter(
+            stream.tap_stream_id,
+            dedup_indexes,
+            dedup_index_size,
+        )
+
+    for tap_stream_id, row in _memory_checked(
+        prefetch(
+            shopify_partners.demux(start_dates),
+            queue_size,
+            PIPELINE_CHUNK_SIZE,
+        ),
+        shopify_partners.memory_budget,
+        writer,
+        ', '.join(catalog_entries),
+    ):
+        if is_new[tap_stream_id](row):
+            sync_record(
+                catalog_entries[tap_stream_id],
+                row,
+                state,
+                writer,
+                rollup,
+                validator,
+            )
+
+
+def _prefetched(
+    tap_data: Callable,
+    queue_size: int,
+    **kwargs: dict,
+) -> Generator[tuple, None, None]:
+    """Yield the records of a stream, fetched ahead in a background thread.
+
+    Arguments:
+        tap_data {Callable} -- Method that yields the records of the stream
+        queue_size {int} -- Chunks of records to fetch ahead, 0 fetches
+            without a background thread
+
+    Keyword Arguments:
+        kwargs {dict} -- Stream state, passed on to tap_data
+
+    Yields:
+        Generator[tuple] -- Records of the stream's record type
+    """
+    yield from prefetch(tap_data(**kwargs), queue_size, PIPELINE_CHUNK_SIZE)
+
+
+def _memory_checked(
+    rows: Iterable,
+    memory_budget: Optional[memory.MemoryBudget],
+    writer: writers.SingerWriter,
+    tap_stream_id: str,
+) -> Iterable:
+    """Yield the records, flushing the writer when nearing the memory budget.
+
+    The memory budget is checked every MEMORY_CHECK_RECORDS records, between
+    the writes of two records.
+
+    Arguments:
+        rows {Iterable} -- Records to write
+        memory_budget {Optional[MemoryBudget]} -- Memory budget, the records
+            are passed on as they are without one
+        writer {SingerWriter} -- Output writer
+        tap_stream_id {str} -- Stream id
+
+    Yields:
+        Iterable -- The records
+    """
+    if memory_budget is None:
+        yield from rows
+        return
+
+    for index, row in enumerate(rows, 1):
+        yield row
+        if index % MEMORY_CHECK_RECORDS:
+            continue
+        if memory_budget.under_pressure(tap_stream_id, 'output'):
+            writer.flush()
+
+
+def new_record_filter(
+    tap_stream_id: str,
+    dedup_indexes: dict,
+    dedup_index_size: int,
+) -> Callable:
+    """Return the function that tells whether a record was not yet emitted.
+
+    Arguments:
+        tap_stream_id {str} -- Stream id
+        dedup_indexes {dict} -- Dedup index per stream id
+        dedup_index_size {int} -- Maximum keys per dedup index, 0 disables
+            deduplication
 
-def sync_record(stream: CatalogEntry, row: dict, state: dict) -> None:
+    Returns:
+        Callable -- Function of a record, whether it is new
+    """
+    if not dedup_index_size:
+        return lambda row: True
+
+    dedup_index: dedup.DedupIndex = dedup_indexes.setdefault(
+        tap_stream_id,
+        dedup.DedupIndex(dedup_index_size),
+    )
+    dedup_key: Callable = attrgetter(*STREAMS[tap_stream_id]['dedup_key'])
+    return lambda row: not dedup_index.seen(dedup_key(row))
+
+
+def unchanged_streams(
+    shopify_partners: Shopify,
+    state: dict,
+    streams: list,
+) -> set:
+    """Return the streams without new data since their bookmark.
+
+    Arguments:
+        shopify_partners {Shopify} -- Shopify Partners client
+        state {dict} -- Tap state
+        streams {list} -- Selected streams
+
+    Returns:
+        set -- Stream ids without records since their bookmark
+    """
+    now: int = shopify_partners.now()
+    windows: dict = {}
+    for stream in streams:
+        stream_state: dict = tools.get_stream_state(
+            state,
+            stream.tap_stream_id,
+        ) or {}
+        bookmark: Optional[str] = stream_state.get(
+            STREAMS[stream.tap_stream_id]['bookmark'],
+        )
+        if bookmark:
+            windows[stream.tap_stream_id] = (
+                timestamps.parse_timestamp(bookmark),
+                now,
+            )
+
+    return set(windows) - shopify_partners.streams_with_data(windows)
+
+
+def sync_record(
+    stream: CatalogEntry,
+    row: tuple,
+    state: dict,
+    writer: Optional[writers.SingerWriter] = None,
+    rollup: Optional[DailyRevenue] = None,
+    validator: Optional[RecordValidator] = None,
+) -> None:
     """Sync the record.
 
     Arguments:
         stream {CatalogEntry} -- Stream catalog
-        row {dict} -- Record
+        row {tuple} -- Record of the stream's record type
         state {dict} -- State
+
+    Keyword Arguments:
+        writer {Optional[SingerWriter]} -- Output writer, Singer messages on
+            stdout when not given (default: {None})
+        rollup {Optional[DailyRevenue]} -- Daily revenue to add the record
+            to, before the state with its totals is written (default: {None})
+        validator {Optional[RecordValidator]} -- Validator of the record,
+            before it is written (default: {None})
     """
+    writer = writer or writers.SingerWriter()
+
     # Retrieve the value of the bookmark
-    bookmark: Optional[str] = tools.retrieve_bookmark_with_path(
-        stream.replication_key,
-        row,
-    )
+    bookmark: Optional[str] = getattr(row, stream.replication_key, None)
 
     # Create new bookmark
     # new_bookmark: str = tools.create_bookmark(stream.tap_stream_id, bookmark)
 
-    # Write a row to the stream
-    singer.write_record(
+    # Write a row to the stream, the record only becomes a dict here
+    record: dict = row._asdict()
+    if validator is not None:
+        validator.validate(stream.tap_stream_id, record)
+    writer.write_record(
         stream.tap_stream_id,
-        row,
+        record,
         time_extracted=datetime.now(timezone.utc),
     )
 
-    # Add milisecond to bookmark so data is never duplicated:
-    bookmark = bookmark.replace('000000Z', '100000Z')
-    
+    if rollup is not None:
+        rollup.add(stream.tap_stream_id, row)
+
     if bookmark:
+        # Advance the bookmark past the record so it is never duplicated
+        bookmark = timestamps.next_bookmark(bookmark)
+
         # Save the bookmark to the state
         singer.write_bookmark(
             state,
@@ -107,4 +553,4 @@ def sync_record(stream: CatalogEntry, row: dict, state: dict) -> None:
         # Clear currently syncing
         tools.clear_currently_syncing(state)
         # Write the bookmark
-        singer.write_state(state)
\ No newline at end of file
+        writer.write_state(state)
\ No newline at end of file
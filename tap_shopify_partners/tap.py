@@ -1,29 +1,107 @@
 """Shopify Partners tap."""
 # -*- coding: utf-8 -*-
 import logging
-from argparse import Namespace
+import sys
+from argparse import ArgumentParser, Namespace
 
 import pkg_resources
 from singer import get_logger, utils
 from singer.catalog import Catalog
 
-from tap_shopify_partners.shopify_partners import Shopify
+from tap_shopify_partners.backfill import backfill
+from tap_shopify_partners.daemon import run_daemon, run_follow
 from tap_shopify_partners.discover import discover
+from tap_shopify_partners.organizations import sync_organizations
+from tap_shopify_partners.shopify_partners import Shopify, create_client
 from tap_shopify_partners.sync import sync
 
 VERSION: str = pkg_resources.get_distribution('tap-shopify-partners').version
 LOGGER: logging.RootLogger = get_logger()
-REQUIRED_CONFIG_KEYS: tuple = (
+REQUIRED_CONFIG_KEYS: tuple = ('start_date',)
+
+# Required without a list of organizations
+ORGANIZATION_CONFIG_KEYS: tuple = (
     'organization_id',
     'shopify_partners_server_token',
-    'start_date'
 )
 
 
+def parse_mode_args() -> Namespace:
+    """Parse the backfill, daemon and follow command line arguments.
+
+    The Singer arguments are parsed by singer.utils.parse_args, which does not
+    accept other arguments. Therefore the backfill, daemon and follow
+    arguments are removed from the command line after parsing them.
+
+    Returns:
+        Namespace -- The backfill, workers, daemon and follow arguments
+    """
+    parser: ArgumentParser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--backfill',
+        nargs=2,
+        metavar=('FROM', 'TO'),
+        help='Backfill the selected streams from FROM up to TO',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes for the backfill',
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Keep running and poll the selected streams on an interval',
+    )
+    parser.add_argument(
+        '--follow',
+        action='store_true',
+        help='Keep running and poll the new events of one stream',
+    )
+    mode_args, other_args = parser.parse_known_args()
+    sys.argv = sys.argv[:1] + other_args
+    return mode_args
+
+
+def check_organization_config(config: dict, mode_args: Namespace) -> None:
+    """Check the organization or the list of organizations of the config.
+
+    The config has either one organization, with its organization_id and
+    shopify_partners_server_token, or a list of organizations with theirs.
+    The token is not required when replaying a recording. A list of
+    organizations is only synced in the normal sync mode.
+
+    Arguments:
+        config {dict} -- Tap config
+        mode_args {Namespace} -- The backfill, workers, daemon and follow
+            arguments
+
+    Raises:
+        ValueError: When a list of organizations is used with another mode
+    """
+    required_keys: tuple = (
+        ORGANIZATION_CONFIG_KEYS[:1] if config.get('replay_path')
+        else ORGANIZATION_CONFIG_KEYS
+    )
+    if not config.get('organizations'):
+        utils.check_config(config, required_keys)
+        return
+
+    for mode in ('backfill', 'daemon', 'follow'):
+        if getattr(mode_args, mode):
+            raise ValueError(
+                f'The --{mode} mode is not supported for organizations.',
+            )
+    for organization in config['organizations']:
+        utils.check_config(organization, required_keys)
+
+
 @utils.handle_top_exception(LOGGER)
 def main() -> None:
     """Run tap."""
     # Parse command line arguments
+    mode_args: Namespace = parse_mode_args()
     args: Namespace = utils.parse_args(REQUIRED_CONFIG_KEYS)
 
     LOGGER.info(f'>>> Running tap-shopify-partners v{VERSION}')
@@ -34,6 +112,8 @@ def main() -> None:
         catalog.dump()
         return
 
+    check_organization_config(args.config, mode_args)
+
     # Otherwise run in sync mode
     if args.catalog:
         # Load command line catalog
@@ -42,13 +122,40 @@ def main() -> None:
         # Loadt the  catalog
         catalog = discover()
 
+    # Run a parallel backfill of the given range instead of a normal sync
+    if mode_args.backfill:
+        backfill(
+            args.config,
+            args.state,
+            catalog,
+            *mode_args.backfill,
+            mode_args.workers,
+        )
+        return
+
+    # Sync every organization of the config in its own thread
+    if args.config.get('organizations'):
+        sync_organizations(args.config, args.state, catalog)
+        return
+
     # Initialize Shopify Partners client
-    shopify_partners: Shopify = Shopify(
-        args.config['organization_id'],
-        args.config['shopify_partners_server_token'],
-    )
+    shopify_partners: Shopify = create_client(args.config)
+
+    # Keep polling the streams with the same client in follow or daemon mode
+    if mode_args.follow:
+        run_follow(shopify_partners, args.state, catalog, args.config)
+        return
+    if mode_args.daemon:
+        run_daemon(shopify_partners, args.state, catalog, args.config)
+        return
 
-    sync(shopify_partners, args.state, catalog, args.config['start_date'])
+    sync(
+        shopify_partners,
+        args.state,
+        catalog,
+        args.config['start_date'],
+        args.config,
+    )
 
 
 if __name__ == '__main__':
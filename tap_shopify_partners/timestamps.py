@@ -0,0 +1,237 @@
+"""Timestamp and day window helpers.
+
+Timestamps are handled as integer microseconds since the Unix epoch (UTC)
+internally and are only formatted to strings when they leave the tap, e.g. in
+a query or a bookmark.
+"""
+# -*- coding: utf-8 -*-
+import time
+from datetime import datetime, timezone
+from typing import Generator, Tuple
+
+from dateutil.parser import isoparse
+
+MICROSECONDS_PER_SECOND: int = 1000000
+MICROSECONDS_PER_DAY: int = 86400 * MICROSECONDS_PER_SECOND
+EPOCH: datetime = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+    """Return the number of days since the epoch for a proleptic date.
+
+    Arguments:
+        year {int} -- Year
+        month {int} -- Month
+        day {int} -- Day
+
+    Returns:
+        int -- Days since 1970-01-01
+    """
+    year -= month <= 2
+    era: int = year // 400
+    year_of_era: int = year - era * 400
+    day_of_year: int = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5
+    day_of_year += day - 1
+    day_of_era: int = (
+        year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    )
+    return era * 146097 + day_of_era - 719468
+
+
+def _civil_from_days(days: int) -> Tuple[int, int, int]:
+    """Return the year, month and day for a number of days since the epoch.
+
+    Arguments:
+        days {int} -- Days since 1970-01-01
+
+    Returns:
+        Tuple[int, int, int] -- Year, month and day
+    """
+    days += 719468
+    era: int = days // 146097
+    day_of_era: int = days - era * 146097
+    year_of_era: int = (
+        day_of_era
+        - day_of_era // 1460
+        + day_of_era // 36524
+        - day_of_era // 146096
+    ) // 365
+    day_of_year: int = day_of_era - (
+        365 * year_of_era + year_of_era // 4 - year_of_era // 100
+    )
+    month_index: int = (5 * day_of_year + 2) // 153
+    day: int = day_of_year - (153 * month_index + 2) // 5 + 1
+    month: int = month_index + (3 if month_index < 10 else -9)
+    return year_of_era + era * 400 + (month <= 2), month, day
+
+
+def _parse_offset(offset: str) -> int:
+    """Parse an UTC offset such as Z, +0000, +00:00 or +00 to seconds.
+
+    Arguments:
+        offset {str} -- UTC offset
+
+    Raises:
+        ValueError: When the offset is not recognized
+
+    Returns:
+        int -- Offset in seconds
+    """
+    if not offset or offset == 'Z':
+        return 0
+    if offset[0] not in '+-' or len(offset) not in {3, 5, 6}:
+        raise ValueError(f'Invalid UTC offset: {offset}')
+    sign: int = -1 if offset[0] == '-' else 1
+    minutes: str = offset[-2:] if len(offset) > 3 else '0'
+    return sign * (int(offset[1:3]) * 3600 + int(minutes) * 60)
+
+
+def from_datetime(value: datetime) -> int:
+    """Convert a datetime to epoch microseconds, naive datetimes are UTC.
+
+    Arguments:
+        value {datetime} -- Datetime
+
+    Returns:
+        int -- Epoch microseconds
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (
+        delta.days * MICROSECONDS_PER_DAY
+        + delta.seconds * MICROSECONDS_PER_SECOND
+        + delta.microseconds
+    )
+
+
+def parse_timestamp(value: str) -> int:  # noqa: WPS210
+    """Parse an ISO-8601 date or timestamp to epoch microseconds.
+
+    Fixed format values, e.g. 2021-01-01T00:00:00.000000Z or
+    2021-01-01T00:00:00+0000, are parsed by slicing the string. Anything else
+    is handed to dateutil's isoparse.
+
+    Arguments:
+        value {str} -- Date or timestamp
+
+    Returns:
+        int -- Epoch microseconds
+    """
+    try:  # noqa: WPS229
+        if value[4] != '-' or value[7] != '-':
+            raise ValueError(value)
+        days: int = _days_from_civil(
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+        )
+        if len(value) == 10:
+            return days * MICROSECONDS_PER_DAY
+
+        if value[10] not in 'T ' or value[13] != ':' or value[16] != ':':
+            raise ValueError(value)
+        seconds: int = (
+            int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+        )
+
+        # Optional fraction, any precision is truncated to microseconds
+        rest: str = value[19:]
+        microseconds: int = 0
+        if rest[:1] == '.':
+            end: int = 1
+            while end < len(rest) and rest[end].isdigit():
+                end += 1
+            microseconds = int(rest[1:end][:6].ljust(6, '0'))
+            rest = rest[end:]
+
+        seconds -= _parse_offset(rest)
+    except (IndexError, ValueError):
+        return from_datetime(isoparse(value))
+
+    return (
+        days * MICROSECONDS_PER_DAY
+        + seconds * MICROSECONDS_PER_SECOND
+        + microseconds
+    )
+
+
+def format_timestamp(value: int) -> str:
+    """Format epoch microseconds as YYYY-MM-DDTHH:MM:SS.ffffffZ.
+
+    Arguments:
+        value {int} -- Epoch microseconds
+
+    Returns:
+        str -- Timestamp in UTC
+    """
+    days, microseconds = divmod(value, MICROSECONDS_PER_DAY)
+    year, month, day = _civil_from_days(days)
+    seconds, microseconds = divmod(microseconds, MICROSECONDS_PER_SECOND)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return (
+        f'{year:04d}-{month:02d}-{day:02d}T'
+        f'{hours:02d}:{minutes:02d}:{seconds:02d}.{microseconds:06d}Z'
+    )
+
+
+def format_day(value: int) -> str:
+    """Format epoch microseconds as YYYY-MM-DD.
+
+    Arguments:
+        value {int} -- Epoch microseconds
+
+    Returns:
+        str -- Date in UTC
+    """
+    year, month, day = _civil_from_days(value // MICROSECONDS_PER_DAY)
+    return f'{year:04d}-{month:02d}-{day:02d}'
+
+
+def now() -> int:
+    """Return the current time.
+
+    Returns:
+        int -- Epoch microseconds
+    """
+    return time.time_ns() // 1000
+
+
+def day_windows(
+    start: int,
+    end: int,
+) -> Generator[Tuple[str, int, int], None, None]:
+    """Yield a window for every day from start until end.
+
+    The first window starts at start, every other window at midnight. Every
+    window ends at the last microsecond of its day, or at end for the last.
+
+    Arguments:
+        start {int} -- Epoch microseconds of the first window start
+        end {int} -- Epoch microseconds of the last window end (inclusive)
+
+    Yields:
+        Generator[Tuple[str, int, int]] -- Day, window start and window end
+    """
+    window_start: int = start
+    while window_start <= end:
+        day_start: int = window_start - window_start % MICROSECONDS_PER_DAY
+        day_end: int = day_start + MICROSECONDS_PER_DAY - 1
+        yield format_day(day_start), window_start, min(day_end, end)
+        window_start = day_end + 1
+
+
+def next_bookmark(value: str) -> str:
+    """Return the timestamp one microsecond after the value.
+
+    Windows include their start, so a bookmark is advanced past the last
+    synced record to never sync that record again.
+
+    Arguments:
+        value {str} -- Timestamp of the last synced record
+
+    Returns:
+        str -- Bookmark
+    """
+    return format_timestamp(parse_timestamp(value) + 1)
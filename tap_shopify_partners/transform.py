@@ -0,0 +1,143 @@
+"""Process pool transform."""
+# -*- coding: utf-8 -*-
+import logging
+import sys
+from collections import deque
+from multiprocessing.pool import Pool
+from typing import Optional
+
+import singer
+from singer import utils
+from singer.catalog import CatalogEntry
+
+from tap_shopify_partners import records, timestamps, tools
+from tap_shopify_partners.cleaners import clean_page
+from tap_shopify_partners.shopify_partners import Shopify
+from tap_shopify_partners.streams import STREAMS
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+# Parts of days per worker that are fetched ahead of the output
+DAYS_PER_WORKER: int = 2
+
+# Edges per part of a day sent to a worker
+DEFAULT_PART_SIZE: int = 10000
+
+
+def encode_day(task: tuple) -> tuple:
+    """Clean, sort and encode the raw edges of a day in a worker process.
+
+    Arguments:
+        task {tuple} -- Stream id and the edges of the day, or of a part of
+            the day
+
+    Returns:
+        tuple -- The Singer RECORD messages, one per line, the number of
+            records and the replication key of the last record
+    """
+    tap_stream_id, edges = task
+    day_records: list = clean_page(tap_stream_id, edges)
+    day_records.sort(key=records.sort_key(tap_stream_id))
+
+    time_extracted = utils.now()
+    lines: str = ''.join(
+        singer.format_message(singer.RecordMessage(
+            stream=tap_stream_id,
+            record=record._asdict(),
+            time_extracted=time_extracted,
+        )) + '\n'
+        for record in day_records
+    )
+
+    last_record: Optional[str] = None
+    if day_records:
+        last_record = getattr(
+            day_records[-1],
+            STREAMS[tap_stream_id]['replication_key'],
+        )
+    return lines, len(day_records), last_record
+
+
+def sync_transformed(  # noqa: WPS210
+    shopify_partners: Shopify,
+    stream: CatalogEntry,
+    stream_state: dict,
+    state: dict,
+    pool: Pool,
+    workers: int,
+    part_size: int = DEFAULT_PART_SIZE,
+) -> None:
+    """Sync a stream, cleaning and encoding its days in a process pool.
+
+    The raw pages of every day are fetched on this thread and cleaned,
+    sorted and encoded to Singer RECORD messages by the workers, in parts of
+    about part_size edges. The messages are written straight to stdout, not
+    through a writer, in order of the days, the records of a day are sorted
+    per part. The state is written once all parts of a day are written. At
+    most DAYS_PER_WORKER parts per worker are in the pool at once, which
+    bounds the buffered edges, also of days with many records.
+
+    Arguments:
+        shopify_partners {Shopify} -- Shopify Partners client
+        stream {CatalogEntry} -- Stream catalog
+        stream_state {dict} -- State of the stream
+        state {dict} -- Tap state
+        pool {Pool} -- Worker processes
+        workers {int} -- Number of worker processes
+
+    Keyword Arguments:
+        part_size {int} -- Edges per part of a day sent to a worker
+            (default: {DEFAULT_PART_SIZE})
+    """
+    tap_stream_id: str = stream.tap_stream_id
+    max_pending: int = workers * DAYS_PER_WORKER
+    pending: deque = deque()
+
+    # Day and last record of the written parts, not yet in the state
+    written: dict = {'day': None, 'last_record': None}
+
+    def write_state() -> None:  # noqa: WPS430
+        if written['last_record']:
+            singer.write_bookmark(
+                state,
+                tap_stream_id,
+                STREAMS[tap_stream_id]['bookmark'],
+                timestamps.next_bookmark(written['last_record']),
+            )
+            tools.clear_currently_syncing(state)
+            singer.write_state(state)
+        written['last_record'] = None
+
+    def write_part() -> None:  # noqa: WPS430
+        date_day, async_result = pending.popleft()
+        lines, count, last_record = async_result.get()
+
+        # Every part of the previous day is written, so is its state
+        if date_day != written['day']:
+            write_state()
+            written['day'] = date_day
+
+        sys.stdout.write(lines)
+        if last_record:
+            written['last_record'] = max(
+                last_record,
+                written['last_record'] or last_record,
+            )
+        LOGGER.debug(f'Wrote {count} encoded records of {tap_stream_id}')
+
+    for date_day, edges in shopify_partners.raw_days(
+        tap_stream_id,
+        max_edges=part_size,
+        **stream_state,
+    ):
+        pending.append((
+            date_day,
+            pool.apply_async(encode_day, ((tap_stream_id, edges),)),
+        ))
+        if len(pending) >= max_pending:
+            write_part()
+
+    while pending:
+        write_part()
+    write_state()
+    sys.stdout.flush()
@@ -0,0 +1,117 @@
+"""Record validation."""
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+import singer
+from jsonschema import Draft4Validator
+from jsonschema.exceptions import ValidationError, best_match
+from singer import metrics
+
+LOGGER: logging.RootLogger = singer.get_logger()
+
+# Validation modes, whether every record or a sample is validated
+VALIDATION_MODES: frozenset = frozenset(('full', 'sample'))
+
+# Every nth record that is validated in sample mode
+DEFAULT_SAMPLE_INTERVAL: int = 100
+
+# Properties of a stream schema that are not part of JSON schema
+CATALOG_PROPERTIES: frozenset = frozenset(('selected',))
+
+
+class RecordValidator(object):
+    """Validate records against the schemas of their streams.
+
+    The validator of every stream is built once, from the schema of the
+    stream in the catalog. In full mode every record is validated, in sample
+    mode every nth record of every stream, starting with the first. The time
+    spent validating is reported per stream as a Singer metric.
+    """
+
+    def __init__(
+        self,
+        streams: list,
+        mode: str,
+        sample_interval: int = DEFAULT_SAMPLE_INTERVAL,
+    ) -> None:
+        """Initialize validator.
+
+        Arguments:
+            streams {list} -- Stream catalogs of the synced streams
+            mode {str} -- Validation mode, full or sample
+
+        Keyword Arguments:
+            sample_interval {int} -- Every nth record that is validated in
+                sample mode (default: {DEFAULT_SAMPLE_INTERVAL})
+
+        Raises:
+            ValueError: When the mode is unknown
+        """
+        if mode not in VALIDATION_MODES:
+            raise ValueError(f'Unknown validation mode: {mode}')
+
+        self.interval: int = 1 if mode == 'full' else max(sample_interval, 1)
+        self.validators: dict = {}
+        for stream in streams:
+            schema: dict = {
+                schema_key: schema_value
+                for schema_key, schema_value in stream.schema.to_dict().items()
+                if schema_key not in CATALOG_PROPERTIES
+            }
+            Draft4Validator.check_schema(schema)
+            self.validators[stream.tap_stream_id] = Draft4Validator(schema)
+
+        self.records: dict = dict.fromkeys(self.validators, 0)
+        self.validated: dict = dict.fromkeys(self.validators, 0)
+        self.seconds: dict = dict.fromkeys(self.validators, 0.0)
+
+    def validate(self, tap_stream_id: str, record: dict) -> None:
+        """Validate a record, when it is sampled.
+
+        Arguments:
+            tap_stream_id {str} -- Stream id
+            record {dict} -- Record
+
+        Raises:
+            ValueError: When the record does not match the schema
+        """
+        validator: Draft4Validator = self.validators[tap_stream_id]
+        count: int = self.records[tap_stream_id]
+        self.records[tap_stream_id] = count + 1
+        if count % self.interval:
+            return
+
+        start: float = time.perf_counter()
+        is_valid: bool = validator.is_valid(record)
+        self.seconds[tap_stream_id] += time.perf_counter() - start
+        self.validated[tap_stream_id] += 1
+
+        if not is_valid:
+            error: ValidationError = best_match(validator.iter_errors(record))
+            path: str = '.'.join(map(str, error.path)) or 'record'
+            raise ValueError(
+                f'Record of {tap_stream_id} does not match its schema, '
+                f'{path}: {error.message}',
+            )
+
+    def report(self) -> None:
+        """Log the validated records and validation time of every stream."""
+        for tap_stream_id, seconds in self.seconds.items():
+            if not self.records[tap_stream_id]:
+                continue
+            metrics.log(LOGGER, metrics.Point(
+                'timer',
+                'validation_duration',
+                seconds,
+                {
+                    metrics.Tag.endpoint: tap_stream_id,
+                    'validated': self.validated[tap_stream_id],
+                    'records': self.records[tap_stream_id],
+                },
+            ))
+            LOGGER.info(
+                f'Validated {self.validated[tap_stream_id]} of '
+                f'{self.records[tap_stream_id]} records of {tap_stream_id} '
+                f'in {seconds:.3f} seconds',
+            )
@@ -0,0 +1,649 @@
+"""Output writers."""
+# -*- coding: utf-8 -*-
+import copy
+import gzip
+import json
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+from typing import IO, Callable, Optional, Tuple
+
+import singer
+
+from tap_shopify_partners import timestamps
+from tap_shopify_partners.mirror import Mirror
+from tap_shopify_partners.streams import DERIVED_STREAMS, STREAMS
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import pyarrow
+    from pyarrow import parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+MEGABYTE: int = 1024 * 1024
+
+# File extension per compression
+EXTENSIONS: dict = {
+    'gzip': '.jsonl.gz',
+    'zstd': '.jsonl.zst',
+    'none': '.jsonl',
+}
+
+
+class SingerWriter(object):
+    """Write Singer messages to stdout."""
+
+    def write_schema(
+        self,
+        stream_name: str,
+        schema: dict,
+        key_properties: list,
+    ) -> None:
+        """Write the schema of a stream.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            schema {dict} -- JSON schema
+            key_properties {list} -- Key properties
+        """
+        singer.write_schema(
+            stream_name=stream_name,
+            schema=schema,
+            key_properties=key_properties,
+        )
+
+    def write_record(
+        self,
+        stream_name: str,
+        record: dict,
+        time_extracted: datetime,
+    ) -> None:
+        """Write a record of a stream.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            record {dict} -- Record
+            time_extracted {datetime} -- Time of extraction
+        """
+        singer.write_record(
+            stream_name,
+            record,
+            time_extracted=time_extracted,
+        )
+
+    def write_state(self, state: dict) -> None:
+        """Write the state.
+
+        Arguments:
+            state {dict} -- State
+        """
+        singer.write_state(state)
+
+    def flush(self) -> None:
+        """Make the written messages durable, without closing the writer."""
+        sys.stdout.flush()
+
+    def close(self) -> None:
+        """Close the writer."""
+
+
+class ShardedWriter(SingerWriter):  # noqa: WPS230
+    """Write the records of every stream to compressed JSON lines shards.
+
+    Every stream gets a directory with shards of at most shard_size bytes
+    (uncompressed). A manifest.json in the output directory lists the schema,
+    key properties and shards of every stream. A shard is listed once it is
+    closed, so loaders can ingest the listed shards in parallel. The shards
+    are named after the run, and the shards of an existing manifest stay
+    listed, so a next run adds shards next to those of earlier runs.
+
+    The state is only written to stdout when a shard is closed, as only then
+    the records before it are durable. The writer keeps a reference to the
+    state, which is only copied when a shard is closed, as the state is
+    written after every record.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        shard_size: int = 128 * MEGABYTE,
+        compression: str = 'gzip',
+    ) -> None:
+        """Initialize writer.
+
+        Arguments:
+            directory {str} -- Output directory
+
+        Keyword Arguments:
+            shard_size {int} -- Maximum uncompressed bytes per shard
+                (default: {128 * MEGABYTE})
+            compression {str} -- gzip, zstd or none (default: {'gzip'})
+
+        Raises:
+            ValueError: When the compression is unknown or not installed
+        """
+        if compression not in EXTENSIONS:
+            raise ValueError(f'Unknown output compression: {compression}')
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError(
+                'The zstd output compression requires the zstandard package.',
+            )
+
+        self.directory: str = directory
+        self.shard_size: int = shard_size
+        self.compression: str = compression
+        self.manifest: dict = {'streams': {}, 'state': None}
+        self.run: int = timestamps.now()
+        self.parts: dict = {}
+        self.shards: dict = {}
+        self.state: Optional[dict] = None
+        self.state_written: bool = True
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Keep listing the shards of earlier runs
+        path: str = os.path.join(directory, 'manifest.json')
+        if os.path.exists(path):
+            with open(path) as manifest_file:
+                self.manifest = json.load(manifest_file)
+
+    def write_schema(
+        self,
+        stream_name: str,
+        schema: dict,
+        key_properties: list,
+    ) -> None:
+        """Add the schema of a stream to the manifest.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            schema {dict} -- JSON schema
+            key_properties {list} -- Key properties
+        """
+        stream_manifest: dict = self.manifest['streams'].setdefault(
+            stream_name,
+            {'shards': []},
+        )
+        stream_manifest['schema'] = schema
+        stream_manifest['key_properties'] = key_properties
+        os.makedirs(os.path.join(self.directory, stream_name), exist_ok=True)
+
+    def write_record(
+        self,
+        stream_name: str,
+        record: dict,
+        time_extracted: datetime,
+    ) -> None:
+        """Write a record to the current shard of the stream.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            record {dict} -- Record
+            time_extracted {datetime} -- Time of extraction
+        """
+        shard: Optional[dict] = self.shards.get(stream_name)
+        if shard is None:
+            shard = self._open_shard(stream_name)
+
+        line: bytes = json.dumps(record).encode('utf-8') + b'\n'
+        shard['file'].write(line)
+        shard['records'] += 1
+        shard['bytes'] += len(line)
+
+        # Close every open shard, so the kept state only covers closed shards
+        if shard['bytes'] >= self.shard_size:
+            self.close()
+
+    def write_state(self, state: dict) -> None:
+        """Keep the state until the current shards are closed.
+
+        Arguments:
+            state {dict} -- State
+        """
+        self.state = state
+        self.state_written = False
+
+    def flush(self) -> None:
+        """Close the current shards, the next records go to new shards."""
+        self.close()
+        sys.stdout.flush()
+
+    def close(self) -> None:
+        """Close all shards and write the manifest and the last state."""
+        for stream_name in list(self.shards):
+            self._close_shard(stream_name)
+        self._write_manifest()
+
+    def _open_shard(self, stream_name: str) -> dict:
+        """Open the next shard of a stream.
+
+        Arguments:
+            stream_name {str} -- Stream name
+
+        Returns:
+            dict -- The shard
+        """
+        self.manifest['streams'].setdefault(stream_name, {'shards': []})
+        part: int = self.parts.get(stream_name, 0)
+        self.parts[stream_name] = part + 1
+        path: str = os.path.join(
+            stream_name,
+            f'part-{self.run}-{part:05d}{EXTENSIONS[self.compression]}',
+        )
+        os.makedirs(os.path.join(self.directory, stream_name), exist_ok=True)
+        shard: dict = {
+            'path': path,
+            'file': self._open(os.path.join(self.directory, path)),
+            'records': 0,
+            'bytes': 0,
+        }
+        self.shards[stream_name] = shard
+        return shard
+
+    def _open(self, path: str) -> IO[bytes]:
+        """Open a file for writing with the compression of the writer.
+
+        Arguments:
+            path {str} -- Path
+
+        Returns:
+            IO[bytes] -- Binary file
+        """
+        if self.compression == 'gzip':
+            return gzip.open(path, 'wb', compresslevel=6)
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+        return open(path, 'wb')
+
+    def _close_shard(self, stream_name: str) -> None:
+        """Close the current shard of a stream and add it to the manifest.
+
+        Arguments:
+            stream_name {str} -- Stream name
+        """
+        shard: dict = self.shards.pop(stream_name)
+        shard['file'].close()
+        self.manifest['streams'][stream_name]['shards'].append({
+            'path': shard['path'],
+            'records': shard['records'],
+            'bytes': shard['bytes'],
+        })
+
+    def _write_manifest(self) -> None:
+        """Write the manifest atomically, then write the kept state."""
+        if not self.state_written:
+            self.manifest['state'] = copy.deepcopy(self.state)
+
+        path: str = os.path.join(self.directory, 'manifest.json')
+        with open(f'{path}.tmp', 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+        os.replace(f'{path}.tmp', path)
+
+        if not self.state_written:
+            singer.write_state(self.manifest['state'])
+            self.state_written = True
+
+
+def _days(input_value: str) -> int:
+    """Convert a date to days since the epoch.
+
+    Arguments:
+        input_value {str} -- Date
+
+    Returns:
+        int -- Days since 1970-01-01
+    """
+    microseconds: int = timestamps.parse_timestamp(input_value)
+    return microseconds // timestamps.MICROSECONDS_PER_DAY
+
+
+def arrow_field(
+    name: str,
+    json_schema: dict,
+) -> Tuple[object, Optional[Callable]]:
+    """Return the Arrow field of a JSON schema property and its converter.
+
+    Arguments:
+        name {str} -- Property name
+        json_schema {dict} -- JSON schema of the property
+
+    Returns:
+        Tuple[pyarrow.Field, Optional[Callable]] -- The field and the function
+            to convert a value to the Arrow type, if needed
+    """
+    json_types: list = json_schema.get('type', [])
+    if isinstance(json_types, str):
+        json_types = [json_types]
+    json_format: Optional[str] = json_schema.get('format')
+
+    converter: Optional[Callable] = None
+    if json_format == 'date-time':
+        data_type = pyarrow.timestamp('us', tz='UTC')
+        converter = timestamps.parse_timestamp
+    elif json_format == 'date':
+        data_type = pyarrow.date32()
+        converter = _days
+    elif json_format == 'singer.decimal':
+        data_type = pyarrow.decimal128(38, 9)
+        converter = Decimal
+    elif 'boolean' in json_types:
+        data_type = pyarrow.bool_()
+    elif 'integer' in json_types:
+        data_type = pyarrow.int64()
+    elif 'number' in json_types:
+        data_type = pyarrow.float64()
+    else:
+        data_type = pyarrow.string()
+
+    return pyarrow.field(name, data_type, 'null' in json_types), converter
+
+
+class ParquetWriter(SingerWriter):  # noqa: WPS230
+    """Write the records to Parquet files next to another writer.
+
+    Every call is passed on to the other writer. The records are also
+    buffered per stream as columns, typed from the stream schema, and written
+    as Arrow record batches to a Parquet file per stream and day, i.e.
+    <directory>/<stream>/date=<day>/part-<run>-<part>.parquet. A stream that
+    returns to a day of which the file was closed, e.g. the daily revenue of
+    another transaction stream, writes the next part of that day.
+    """
+
+    def __init__(
+        self,
+        writer: SingerWriter,
+        directory: str,
+        batch_size: int = 10000,
+    ) -> None:
+        """Initialize writer.
+
+        Arguments:
+            writer {SingerWriter} -- Writer to pass every call on to
+            directory {str} -- Output directory
+
+        Keyword Arguments:
+            batch_size {int} -- Records per record batch (default: {10000})
+
+        Raises:
+            ValueError: When pyarrow is not installed
+        """
+        if pyarrow is None:
+            raise ValueError('The Parquet output requires the pyarrow package.')
+
+        self.writer: SingerWriter = writer
+        self.directory: str = directory
+        self.batch_size: int = batch_size
+        self.run: int = timestamps.now()
+        self.streams: dict = {}
+        self.parts: dict = {}
+
+    def write_schema(
+        self,
+        stream_name: str,
+        schema: dict,
+        key_properties: list,
+    ) -> None:
+        """Create the Arrow schema of a stream.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            schema {dict} -- JSON schema
+            key_properties {list} -- Key properties
+        """
+        self.writer.write_schema(stream_name, schema, key_properties)
+
+        # The buffered records of the previous schema of the stream
+        if stream_name in self.streams:
+            self._close_file(stream_name)
+
+        fields: list = []
+        converters: list = []
+        for name, property_schema in schema['properties'].items():
+            field, converter = arrow_field(name, property_schema)
+            fields.append(field)
+            converters.append(converter)
+
+        self.streams[stream_name] = {
+            'schema': pyarrow.schema(fields),
+            'converters': converters,
+            'replication_key': (
+                STREAMS.get(stream_name) or DERIVED_STREAMS[stream_name]
+            )['replication_key'],
+            'columns': [[] for _ in fields],
+            'day': None,
+            'file': None,
+        }
+
+    def write_record(
+        self,
+        stream_name: str,
+        record: dict,
+        time_extracted: datetime,
+    ) -> None:
+        """Buffer a record in the columns of its stream.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            record {dict} -- Record
+            time_extracted {datetime} -- Time of extraction
+        """
+        self.writer.write_record(stream_name, record, time_extracted)
+
+        stream: dict = self.streams[stream_name]
+
+        # Start the file of the next day
+        day: str = timestamps.format_day(
+            timestamps.parse_timestamp(record[stream['replication_key']]),
+        )
+        if day != stream['day']:
+            self._close_file(stream_name)
+            stream['day'] = day
+
+        for column, field in zip(stream['columns'], stream['schema']):
+            column.append(record.get(field.name))
+
+        if len(stream['columns'][0]) >= self.batch_size:
+            self._write_batch(stream_name)
+
+    def write_state(self, state: dict) -> None:
+        """Pass the state on to the other writer.
+
+        Arguments:
+            state {dict} -- State
+        """
+        self.writer.write_state(state)
+
+    def flush(self) -> None:
+        """Close all files, the next records go to files of a new run."""
+        for stream_name in self.streams:
+            self._close_file(stream_name)
+        self.run = timestamps.now()
+        self.parts = {}
+        self.writer.flush()
+
+    def close(self) -> None:
+        """Write the buffered records and close all files."""
+        for stream_name in self.streams:
+            self._close_file(stream_name)
+        self.writer.close()
+
+    def _write_batch(self, stream_name: str) -> None:
+        """Write the buffered columns of a stream as a record batch.
+
+        Arguments:
+            stream_name {str} -- Stream name
+        """
+        stream: dict = self.streams[stream_name]
+        if not stream['columns'][0]:
+            return
+
+        arrays: list = []
+        for column, converter, field in zip(
+            stream['columns'],
+            stream['converters'],
+            stream['schema'],
+        ):
+            if converter is not None:
+                column = [
+                    None if input_value is None else converter(input_value)
+                    for input_value in column
+                ]
+            arrays.append(pyarrow.array(column, type=field.type))
+
+        if stream['file'] is None:
+            day_directory: str = os.path.join(
+                self.directory,
+                stream_name,
+                f'date={stream["day"]}',
+            )
+            os.makedirs(day_directory, exist_ok=True)
+            part: int = self.parts.get((stream_name, stream['day']), 0)
+            self.parts[(stream_name, stream['day'])] = part + 1
+            stream['file'] = parquet.ParquetWriter(
+                os.path.join(
+                    day_directory,
+                    f'part-{self.run}-{part:05d}.parquet',
+                ),
+                stream['schema'],
+            )
+
+        stream['file'].write_batch(
+            pyarrow.RecordBatch.from_arrays(arrays, schema=stream['schema']),
+        )
+        stream['columns'] = [[] for _ in stream['columns']]
+
+    def _close_file(self, stream_name: str) -> None:
+        """Write the buffered records and close the file of a stream.
+
+        Arguments:
+            stream_name {str} -- Stream name
+        """
+        self._write_batch(stream_name)
+        stream: dict = self.streams[stream_name]
+        if stream['file'] is not None:
+            stream['file'].close()
+            stream['file'] = None
+
+
+class MirrorWriter(SingerWriter):
+    """Update a local mirror next to another writer.
+
+    Every call is passed on to the other writer. The records are also
+    upserted in the mirror, which is committed with the latest state every
+    commit_size records and when the writer is closed.
+    """
+
+    def __init__(
+        self,
+        writer: SingerWriter,
+        local_mirror: Mirror,
+        commit_size: int = 1000,
+    ) -> None:
+        """Initialize writer.
+
+        Arguments:
+            writer {SingerWriter} -- Writer to pass every call on to
+            local_mirror {Mirror} -- Mirror to update
+
+        Keyword Arguments:
+            commit_size {int} -- Records per commit (default: {1000})
+        """
+        self.writer: SingerWriter = writer
+        self.mirror: Mirror = local_mirror
+        self.commit_size: int = commit_size
+        self.uncommitted: int = 0
+        self.state: Optional[dict] = None
+
+    def write_schema(
+        self,
+        stream_name: str,
+        schema: dict,
+        key_properties: list,
+    ) -> None:
+        """Pass the schema on to the other writer.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            schema {dict} -- JSON schema
+            key_properties {list} -- Key properties
+        """
+        self.writer.write_schema(stream_name, schema, key_properties)
+
+    def write_record(
+        self,
+        stream_name: str,
+        record: dict,
+        time_extracted: datetime,
+    ) -> None:
+        """Upsert a record in the mirror, derived streams are not mirrored.
+
+        Arguments:
+            stream_name {str} -- Stream name
+            record {dict} -- Record
+            time_extracted {datetime} -- Time of extraction
+        """
+        self.writer.write_record(stream_name, record, time_extracted)
+        if stream_name not in STREAMS:
+            return
+        self.mirror.upsert(stream_name, record)
+        self.uncommitted += 1
+
+    def write_state(self, state: dict) -> None:
+        """Keep the state for the next commit.
+
+        Arguments:
+            state {dict} -- State
+        """
+        self.writer.write_state(state)
+        self.state = state
+        if self.uncommitted >= self.commit_size:
+            self.mirror.commit(self.state)
+            self.uncommitted = 0
+
+    def flush(self) -> None:
+        """Commit the mirror with the latest state."""
+        self.writer.flush()
+        self.mirror.commit(self.state)
+        self.uncommitted = 0
+
+    def close(self) -> None:
+        """Commit the mirror and close it."""
+        self.mirror.commit(self.state)
+        self.mirror.close()
+        self.writer.close()
+
+
+def create_writer(config: dict) -> SingerWriter:
+    """Create the writer configured in the tap config.
+
+    Arguments:
+        config {dict} -- Tap config
+
+    Returns:
+        SingerWriter -- Sharded writer when an output_directory is set,
+            otherwise the stdout writer, next to a Parquet writer when a
+            parquet_directory is set and a mirror writer when a mirror_path
+            is set
+    """
+    writer: SingerWriter = SingerWriter()
+    if config.get('output_directory'):
+        writer = ShardedWriter(
+            config['output_directory'],
+            int(config.get('output_shard_size_mb', 128)) * MEGABYTE,
+            config.get('output_compression', 'gzip'),
+        )
+    if config.get('parquet_directory'):
+        writer = ParquetWriter(
+            writer,
+            config['parquet_directory'],
+            int(config.get('parquet_batch_size', 10000)),
+        )
+    if config.get('mirror_path') and config.get('mirror_mode') != 'read':
+        writer = MirrorWriter(writer, Mirror(config['mirror_path']))
+    return writer
@@ -0,0 +1,241 @@
+"""Tests of the timestamp and day window helpers."""
+# -*- coding: utf-8 -*-
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from dateutil.parser import isoparse
+
+from tap_shopify_partners import timestamps
+
+EPOCH_DATE: date = date(1970, 1, 1)
+
+
+def reference(value: str) -> int:
+    """Parse a timestamp to epoch microseconds with dateutil.
+
+    Arguments:
+        value {str} -- Date or timestamp
+
+    Returns:
+        int -- Epoch microseconds
+    """
+    return timestamps.from_datetime(isoparse(value))
+
+
+def to_datetime(value: int) -> datetime:
+    """Convert epoch microseconds to an aware datetime.
+
+    Arguments:
+        value {int} -- Epoch microseconds
+
+    Returns:
+        datetime -- Datetime in UTC
+    """
+    return timestamps.EPOCH + timedelta(microseconds=value)
+
+
+@pytest.mark.parametrize('value', [
+    '2021-01-01',
+    '2020-02-29',
+    '2021-01-01T00:00:00Z',
+    '2021-01-01T00:00:00+0000',
+    '2021-01-01T00:00:00+00:00',
+    '2021-06-15T12:34:56.789Z',
+    '2021-06-15T12:34:56.123456Z',
+    '2021-06-15T12:34:56.1Z',
+    '2021-06-15T23:59:59.999999+02:00',
+    '2021-06-15T00:30:00-0530',
+    '2021-06-15T00:30:00+05',
+    '2021-06-15 08:00:00Z',
+    '2021-12-31T23:59:59.999999Z',
+    '2000-02-29T12:00:00Z',
+    '2100-03-01T00:00:00Z',
+    '1969-12-31T23:59:59.999999Z',
+    '1600-02-29T00:00:00Z',
+    '2021-06-15T12:34:56',
+    '20210615T123456Z',
+])
+def test_parse_timestamp(value: str) -> None:
+    """Parse fixed format and other values as dateutil does.
+
+    Arguments:
+        value {str} -- Date or timestamp
+    """
+    assert timestamps.parse_timestamp(value) == reference(value)
+
+
+def test_parse_timestamp_truncates_nanoseconds() -> None:
+    """Truncate fractions beyond microseconds."""
+    assert timestamps.parse_timestamp(
+        '2021-06-15T12:34:56.123456789Z',
+    ) == reference('2021-06-15T12:34:56.123456Z')
+
+
+@pytest.mark.parametrize('offset, seconds', [
+    ('', 0),
+    ('Z', 0),
+    ('+0000', 0),
+    ('+00:00', 0),
+    ('+02', 7200),
+    ('+0230', 9000),
+    ('-05:30', -19800),
+])
+def test_parse_offset(offset: str, seconds: int) -> None:
+    """Parse UTC offsets to seconds.
+
+    Arguments:
+        offset {str} -- UTC offset
+        seconds {int} -- Expected offset in seconds
+    """
+    assert timestamps._parse_offset(offset) == seconds  # noqa: WPS437
+
+
+@pytest.mark.parametrize('offset', ['0000', '+0', '+000', 'UTC'])
+def test_parse_offset_invalid(offset: str) -> None:
+    """Reject unknown UTC offsets.
+
+    Arguments:
+        offset {str} -- UTC offset
+    """
+    with pytest.raises(ValueError):
+        timestamps._parse_offset(offset)  # noqa: WPS437
+
+
+@pytest.mark.parametrize('day', [
+    date(1, 1, 1),
+    date(1600, 2, 29),
+    date(1900, 2, 28),
+    date(1900, 3, 1),
+    date(1969, 12, 31),
+    date(1970, 1, 1),
+    date(2000, 2, 29),
+    date(2000, 3, 1),
+    date(2020, 12, 31),
+    date(2021, 1, 1),
+    date(2100, 2, 28),
+    date(2100, 3, 1),
+    date(9999, 12, 31),
+])
+def test_civil_days(day: date) -> None:
+    """Convert dates to days since the epoch and back.
+
+    Arguments:
+        day {date} -- Date
+    """
+    days: int = (day - EPOCH_DATE).days
+    assert timestamps._days_from_civil(  # noqa: WPS437
+        day.year,
+        day.month,
+        day.day,
+    ) == days
+    assert timestamps._civil_from_days(days) == (  # noqa: WPS437
+        day.year,
+        day.month,
+        day.day,
+    )
+
+
+def test_civil_days_every_day() -> None:
+    """Convert every day of four centuries and back."""
+    day: date = date(1900, 1, 1)
+    days: int = (day - EPOCH_DATE).days
+    while day < date(2300, 1, 1):
+        assert timestamps._civil_from_days(days) == (  # noqa: WPS437
+            day.year,
+            day.month,
+            day.day,
+        )
+        day += timedelta(days=1)
+        days += 1
+
+
+@pytest.mark.parametrize('value', [
+    '2021-01-01T00:00:00Z',
+    '2021-06-15T12:34:56.000001Z',
+    '2020-02-29T23:59:59.999999Z',
+    '1969-12-31T23:59:59.999999Z',
+    '2100-03-01T00:00:00.5Z',
+])
+def test_format_timestamp(value: str) -> None:
+    """Format epoch microseconds as datetime does.
+
+    Arguments:
+        value {str} -- Timestamp
+    """
+    epoch_microseconds: int = reference(value)
+    assert timestamps.format_timestamp(epoch_microseconds) == (
+        to_datetime(epoch_microseconds).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    )
+    assert timestamps.parse_timestamp(
+        timestamps.format_timestamp(epoch_microseconds),
+    ) == epoch_microseconds
+    assert timestamps.format_day(epoch_microseconds) == (
+        to_datetime(epoch_microseconds).date().isoformat()
+    )
+
+
+@pytest.mark.parametrize('start, end', [
+    ('2021-01-01T00:00:00Z', '2021-01-01T00:00:00Z'),
+    ('2021-01-01T00:00:00Z', '2021-01-01T23:59:59.999999Z'),
+    ('2021-01-01T13:14:15.161718Z', '2021-01-04T01:02:03Z'),
+    ('2020-02-28T12:00:00Z', '2020-03-01T12:00:00Z'),
+    ('2020-12-31T23:59:59.999999Z', '2021-01-01T00:00:00Z'),
+    ('1969-12-31T12:00:00Z', '1970-01-01T12:00:00Z'),
+])
+def test_day_windows(start: str, end: str) -> None:
+    """Split a range in windows per day that end at midnight.
+
+    Arguments:
+        start {str} -- Start of the range
+        end {str} -- End of the range (inclusive)
+    """
+    start_datetime: datetime = isoparse(start)
+    end_datetime: datetime = isoparse(end)
+    expected: list = []
+    window_start: datetime = start_datetime
+    while window_start <= end_datetime:
+        next_midnight: datetime = datetime.combine(
+            window_start.date() + timedelta(days=1),
+            datetime.min.time(),
+            tzinfo=timezone.utc,
+        )
+        window_end: datetime = min(
+            next_midnight - timedelta(microseconds=1),
+            end_datetime,
+        )
+        expected.append((
+            window_start.date().isoformat(),
+            timestamps.from_datetime(window_start),
+            timestamps.from_datetime(window_end),
+        ))
+        window_start = next_midnight
+
+    assert list(timestamps.day_windows(
+        reference(start),
+        reference(end),
+    )) == expected
+
+
+def test_day_windows_empty() -> None:
+    """Yield no windows when the range ends before it starts."""
+    assert not list(timestamps.day_windows(
+        reference('2021-01-02T00:00:00Z'),
+        reference('2021-01-01T00:00:00Z'),
+    ))
+
+
+@pytest.mark.parametrize('value, bookmark', [
+    ('2021-01-01T00:00:00Z', '2021-01-01T00:00:00.000001Z'),
+    ('2021-01-01T23:59:59.999999Z', '2021-01-02T00:00:00.000000Z'),
+    ('2020-12-31T23:59:59.999999Z', '2021-01-01T00:00:00.000000Z'),
+    ('2021-01-01T02:00:00+0200', '2021-01-01T00:00:00.000001Z'),
+    ('2021-01-01', '2021-01-01T00:00:00.000001Z'),
+])
+def test_next_bookmark(value: str, bookmark: str) -> None:
+    """Advance a bookmark one microsecond past a record, in UTC.
+
+    Arguments:
+        value {str} -- Timestamp of the record
+        bookmark {str} -- Expected bookmark
+    """
+    assert timestamps.next_bookmark(value) == bookmark